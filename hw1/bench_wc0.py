@@ -0,0 +1,348 @@
+#!/usr/bin/env python3 -B
+"""Benchmarks for wc0_fixed.
+
+  python3 bench_wc0.py                       run every benchmark
+  python3 bench_wc0.py stopwords topn ...    run some of them
+  python3 bench_wc0.py stages --tokens 2000000 --vocab 50000 --skew 1.1
+                                             per-stage timings, saved to the history
+                                             file and compared with the previous run
+  python3 bench_wc0.py stages --profile      also print cProfile / tracemalloc hot spots
+"""
+import io
+import os
+import json
+import sys
+import time
+import random
+import resource
+import tempfile
+import subprocess
+import tracemalloc
+import multiprocessing
+from itertools import accumulate
+from contextlib import redirect_stdout
+from types import SimpleNamespace
+from concurrent.futures import ProcessPoolExecutor
+import argparse
+import cProfile
+import pstats
+from wc0_fixed import (WordCounter, CountMinSketch, TextWriter, JsonWriter, CsvWriter,
+                       count_words, count_incremental, count_corpus, load_stopwords,
+                       get_sort_key, sort_words, top_words, normalize_word, clean_word,
+                       is_valid_word, increment, CONFIG)
+
+STOPWORD_FILES = ["stopwords_english.txt", "stopwords_long.txt",
+                  "stopwords_spanish.txt", "stopwords_spanish_long.txt"]
+
+def make_corpus(path, n_tokens=200_000, vocab=5_000, seed=1, skew=0.0):
+    # Mix of stopwords and synthetic words so the filter sees both outcomes;
+    # skew > 0 draws words with Zipf weights 1/rank**skew
+    rng = random.Random(seed)
+    words = [f"w{i}" for i in range(vocab)]
+    for f in STOPWORD_FILES:
+        words += sorted(load_stopwords(f))
+    rng.shuffle(words)
+    cum = list(accumulate(1 / (r + 1) ** skew for r in range(len(words)))) if skew else None
+    with open(path, "w") as f:
+        for start in range(0, n_tokens, 12):
+            f.write(" ".join(rng.choices(words, cum_weights=cum, k=12)) + "\n")
+    return n_tokens
+
+def timed(fn, *args, **kwargs):
+    start = time.perf_counter()
+    out = fn(*args, **kwargs)
+    return out, time.perf_counter() - start
+
+def _run_measured(fn, args, kwargs):
+    start = time.perf_counter()
+    out = fn(*args, **kwargs)
+    elapsed = time.perf_counter() - start
+    return out, elapsed, resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+def measured(fn, *args, **kwargs):
+    # Runs fn in a fresh (spawned) process so peak RSS belongs to that run alone
+    ctx = multiprocessing.get_context("spawn")
+    with ProcessPoolExecutor(max_workers=1, mp_context=ctx) as pool:
+        return pool.submit(_run_measured, fn, args, kwargs).result()
+
+def scan_count(file, stopwords_path):
+    # The old path: reopen and scan the stopword file for every token
+    counts = {}
+    with open(file) as f:
+        for line in f:
+            for word in line.split():
+                word = word.lower().strip(CONFIG["punctuation"])
+                with open(stopwords_path) as s:
+                    if any(l.strip() == word for l in s):
+                        continue
+                counts[word] = counts.get(word, 0) + 1
+    return counts
+
+def bench_stopwords(n_tokens=200_000, scan_tokens=5_000):
+    """Tokens/sec per stopword list: indexed lookup vs per-token file scan."""
+    with tempfile.TemporaryDirectory() as tmp:
+        big, small = os.path.join(tmp, "big.txt"), os.path.join(tmp, "small.txt")
+        make_corpus(big, n_tokens)
+        make_corpus(small, scan_tokens)
+        print(f"{'stopwords':28} {'size':>5} {'index tok/s':>12} {'scan tok/s':>11}")
+        for path in STOPWORD_FILES:
+            index = load_stopwords(path)
+            _, t = timed(count_words, big, index)
+            scan, ts = timed(scan_count, small, path)
+            assert scan == count_words(small, index).counts
+            print(f"{path:28} {len(index):5} {n_tokens/t:12,.0f} {scan_tokens/ts:11,.0f}")
+
+def bench_parallel(n_tokens=2_000_000):
+    """Serial vs sharded counting on one large file (results must be identical)."""
+    with tempfile.TemporaryDirectory() as tmp:
+        big = os.path.join(tmp, "big.txt")
+        make_corpus(big, n_tokens)
+        serial, t1 = timed(count_words, big, workers=1)
+        print(f"{'workers':>7} {'tok/s':>12} {'speedup':>8}")
+        print(f"{1:7} {n_tokens/t1:12,.0f} {1:8.2f}")
+        for workers in sorted({2, 4, os.cpu_count() or 1} - {1}):
+            par, t = timed(count_words, big, workers=workers)
+            assert par.counts == serial.counts and par.sorted_words == serial.sorted_words
+            print(f"{workers:7} {n_tokens/t:12,.0f} {t1/t:8.2f}")
+
+def bench_engines(n_tokens=2_000_000):
+    """Tokens/sec and peak RSS (KiB) of each counting engine, each in its own process."""
+    with tempfile.TemporaryDirectory() as tmp:
+        big = os.path.join(tmp, "big.txt")
+        make_corpus(big, n_tokens)
+        print(f"{'engine':8} {'tok/s':>12} {'peak RSS KiB':>13}")
+        ref = None
+        for engine in ["lines", "mmap"]:
+            res, t, rss = measured(count_words, big, workers=1, engine=engine)
+            ref = ref or res
+            assert res.counts == ref.counts and res.sorted_words == ref.sorted_words
+            print(f"{engine:8} {n_tokens/t:12,.0f} {rss:13,}")
+
+def bench_topn(vocab=2_000_000, n=10):
+    """Full sort vs bounded-heap top-N on a large vocabulary."""
+    rng = random.Random(1)
+    counts = {f"w{i}": int(rng.paretovariate(1.2)) for i in range(vocab)}
+    print(f"{'policy':6} {'reverse':7} {'sort s':>8} {'heap s':>8}")
+    for policy in ("count", "word"):
+        for reverse in (True, False):
+            key = get_sort_key(policy)
+            full, ts = timed(sort_words, counts, key, reverse)
+            top, th = timed(top_words, counts, key, reverse, n)
+            assert top == full[:n]
+            print(f"{policy:6} {reverse!s:7} {ts:8.3f} {th:8.3f}")
+
+def bench_incremental(n_tokens=2_000_000, appended=20_000):
+    """Full recount vs incremental store: first run, unchanged rerun, small append."""
+    with tempfile.TemporaryDirectory() as tmp:
+        big, store = os.path.join(tmp, "big.txt"), os.path.join(tmp, "store.sqlite")
+        extra = os.path.join(tmp, "extra.txt")
+        make_corpus(big, n_tokens)
+        make_corpus(extra, appended, seed=2)
+        _, t_full = timed(count_words, big, workers=1)
+        _, t_first = timed(count_incremental, big, store)
+        _, t_same = timed(count_incremental, big, store)
+        with open(big, "a") as f, open(extra) as g:
+            f.write(g.read())
+        inc, t_add = timed(count_incremental, big, store)
+        assert inc.counts == count_words(big, workers=1).counts
+        for label, t in [("full recount", t_full), ("incremental, first run", t_first),
+                         ("incremental, unchanged", t_same), ("incremental, +append", t_add)]:
+            print(f"{label:24} {t:8.3f}s")
+
+def bench_corpus(files=8, n_tokens=250_000, vocab=200_000):
+    """Corpus mode over a directory: peak RSS (KiB) and time vs the in-memory budget."""
+    with tempfile.TemporaryDirectory() as tmp:
+        for i in range(files):
+            make_corpus(os.path.join(tmp, f"part{i}.txt"), n_tokens, vocab, seed=i)
+        print(f"{'max_words':>10} {'seconds':>8} {'peak RSS KiB':>13}")
+        for budget in (10**9, 100_000, 10_000):
+            _, t, rss = measured(_corpus_top, tmp, budget)
+            print(f"{budget:10} {t:8.2f} {rss:13,}")
+
+def _corpus_top(source, max_words):
+    res = count_corpus(source, max_words=max_words, top_n=CONFIG["top_n"])
+    return res.sorted_words, len(res.counts)
+
+def bench_approx(n_tokens=1_000_000, vocab=200_000, n=10):
+    """Approximate engine: accuracy of the top-N vs sketch memory, against exact counts."""
+    with tempfile.TemporaryDirectory() as tmp:
+        big = os.path.join(tmp, "big.txt")
+        make_corpus(big, n_tokens, vocab, skew=1.1)
+        exact, t_exact = timed(count_words, big, workers=1, engine="lines", top_n="all")
+        truth = [w for w, _ in exact.sorted_words[:n]]
+        print(f"exact dict: {len(exact.counts):,} words, {t_exact:.2f}s\n")
+        print(f"{'epsilon':>8} {'sketch KiB':>10} {'recall':>6} {'max err':>7} {'seconds':>7}")
+        for eps in (1e-2, 1e-3, 1e-4, 1e-5):
+            cfg = {"epsilon": eps, "delta": 0.01, "capacity": 10 * n}
+            counter = WordCounter({**CONFIG, "approx": cfg})
+            res, t = timed(counter.count, big, engine="approx", top_n=n)
+            got = [w for w, _ in res.sorted_words]
+            err = max(res.counts[w] - exact.counts.get(w, 0) for w in got)
+            kib = CountMinSketch(eps, 0.01).nbytes() // 1024
+            print(f"{eps:8g} {kib:10,} {len(set(got) & set(truth)) / n:6.2f} {err:7} {t:7.2f}")
+
+def bench_pipeline(calls=2_000):
+    """Import cost, and many small counts: one reused pipeline vs the module API."""
+    with tempfile.TemporaryDirectory() as tmp:
+        small = os.path.join(tmp, "small.txt")
+        make_corpus(small, 24)
+        t0 = time.perf_counter()
+        subprocess.run([sys.executable, "-c", "import wc0_fixed"], check=True)
+        print(f"import (new interpreter): {time.perf_counter() - t0:.3f}s")
+        counter = WordCounter(CONFIG)
+        _, t_reused = timed(lambda: [counter.count(small) for _ in range(calls)])
+        _, t_module = timed(lambda: [count_words(small) for _ in range(calls)])
+        print(f"{calls} counts, reused pipeline: {t_reused:.3f}s")
+        print(f"{calls} counts, count_words():   {t_module:.3f}s")
+
+def _peak(fn, *args):
+    tracemalloc.start()
+    try:
+        _, t = timed(fn, *args)
+        return t, tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+def bench_reports(vocab=500_000):
+    """Writing top_n="all" reports: whole-string json.dumps/join vs streaming writers."""
+    rng = random.Random(1)
+    ranked = sorted(((f"w{i}", int(rng.paretovariate(1.2))) for i in range(vocab)),
+                    key=lambda x: x[1], reverse=True)
+    res = SimpleNamespace(file="big.txt", counts=dict(ranked), sorted_words=ranked)
+    cfg = {**CONFIG, "top_n": "all"}
+    with tempfile.TemporaryDirectory() as tmp:
+        cfg["output"] = {**CONFIG["output"], "output_dir": tmp}
+        counter = WordCounter(cfg)
+
+        def whole_strings():
+            with open(os.path.join(tmp, "a.json"), "w") as f:
+                f.write(json.dumps({"file": res.file, "top": ranked}, indent=2))
+            with open(os.path.join(tmp, "a.csv"), "w") as f:
+                f.write("\n".join(["rank,word,count"] + [f"{i},{w},{c}" for i, (w, c) in enumerate(ranked, 1)]))
+
+        def streaming():
+            with redirect_stdout(io.StringIO()):
+                counter.write_reports(res)
+
+        for label, fn in [("whole strings", whole_strings), ("streaming, one pass", streaming)]:
+            t, peak = _peak(fn)
+            print(f"{label:20} {t:7.2f}s  peak alloc {peak / 2**20:8.1f} MiB")
+
+#--- Stage harness: per-stage timings with a JSON history and regression check ---
+def time_stages(path, counter):
+    # Each stage runs as its own pass over the previous stage's output
+    stages = {}
+    punctuation, stopwords = counter.punctuation, counter.stopwords
+
+    def stage(name, fn):
+        out, stages[name] = timed(fn)
+        return out
+
+    lines = stage("read", lambda: open(path).read().splitlines())
+    tokens = stage("split", lambda: [w for line in lines for w in line.split()])
+    words = stage("normalize/clean", lambda: [clean_word(normalize_word(w), punctuation) for w in tokens])
+    kept = stage("stopword filter", lambda: [w for w in words if is_valid_word(w, stopwords)])
+
+    def count():
+        counts = {}
+        for w in kept: increment(counts, w)
+        return counts
+    counts = stage("increment", count)
+    ranked = stage("sort", lambda: counter.rank(counts, counter.top_n))
+    res = SimpleNamespace(file=path, counts=counts, sorted_words=ranked)
+    sink = io.StringIO()
+    stage("report", lambda: counter.write_report(res, TextWriter(sink, counter), JsonWriter(sink), CsvWriter(sink)))
+    return stages, len(tokens)
+
+def check_regressions(run, previous, threshold):
+    # A stage (or throughput) more than threshold worse than the last comparable run
+    flags = []
+    for name, t in run["stages"].items():
+        before = previous["stages"].get(name)
+        if before and t > before * (1 + threshold) and t - before > 0.005:
+            flags.append(f"{name}: {before:.3f}s -> {t:.3f}s")
+    if run["tokens_per_sec"] < previous["tokens_per_sec"] * (1 - threshold):
+        flags.append(f"tokens/sec: {previous['tokens_per_sec']:,.0f} -> {run['tokens_per_sec']:,.0f}")
+    return flags
+
+def bench_stages(opts=None):
+    """Per-stage timings, end-to-end tokens/sec and peak RSS, kept in a JSON history."""
+    opts = opts or parse_args(["stages"])
+    params = {"tokens": opts.tokens, "vocab": opts.vocab, "skew": opts.skew, "engine": opts.engine}
+    counter = WordCounter(CONFIG)
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "corpus.txt")
+        make_corpus(path, opts.tokens, opts.vocab, seed=opts.seed, skew=opts.skew)
+        stages, n_tokens = time_stages(path, counter)
+        _, elapsed, rss = measured(count_words, path, workers=1, engine=opts.engine)
+        if opts.profile:
+            profile(counter, path, opts.engine)
+    run = {"when": time.strftime("%Y-%m-%dT%H:%M:%S"), "params": params,
+           "stages": stages, "seconds": elapsed, "tokens_per_sec": n_tokens / elapsed,
+           "peak_rss_kib": rss}
+
+    print(f"{'stage':16} {'seconds':>8}")
+    for name, t in stages.items():
+        print(f"{name:16} {t:8.3f}")
+    print(f"\nend to end ({opts.engine}): {elapsed:.3f}s, {run['tokens_per_sec']:,.0f} tok/s, peak RSS {rss:,} KiB")
+
+    history = []
+    if os.path.exists(opts.history):
+        with open(opts.history) as f:
+            history = json.load(f)
+    previous = next((r for r in reversed(history) if r["params"] == params), None)
+    flags = check_regressions(run, previous, opts.threshold) if previous else []
+    run["regressions"] = flags
+    history.append(run)
+    with open(opts.history, "w") as f:
+        json.dump(history, f, indent=2)
+    if previous is None:
+        print(f"no earlier run with these parameters in {opts.history}")
+    for flag in flags:
+        print(f"REGRESSION {flag}")
+    return flags
+
+def profile(counter, path, engine, top=15):
+    # Optional hot-spot hook: cProfile by cumulative time, tracemalloc by allocating line
+    prof = cProfile.Profile()
+    prof.runcall(counter.count, path, workers=1, engine=engine)
+    pstats.Stats(prof).sort_stats("cumulative").print_stats(top)
+    tracemalloc.start()
+    res = counter.count(path, workers=1, engine=engine)  # kept alive for the snapshot
+    snapshot = tracemalloc.take_snapshot()
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    print(f"traced peak {peak / 2**20:.1f} MiB for {len(res.counts):,} words; live allocations:")
+    for stat in snapshot.statistics("lineno")[:top]:
+        print(f"  {stat}")
+
+BENCHES = {"stages": bench_stages, "stopwords": bench_stopwords, "parallel": bench_parallel,
+           "engines": bench_engines, "topn": bench_topn,
+           "incremental": bench_incremental, "corpus": bench_corpus,
+           "approx": bench_approx, "pipeline": bench_pipeline,
+           "reports": bench_reports}
+
+def parse_args(argv):
+    p = argparse.ArgumentParser(description="Benchmarks for wc0_fixed")
+    p.add_argument("names", nargs="*", help=f"any of: {', '.join(BENCHES)} (default: all)")
+    p.add_argument("--tokens", type=int, default=1_000_000, help="stages: corpus size in tokens")
+    p.add_argument("--vocab", type=int, default=20_000, help="stages: distinct synthetic words")
+    p.add_argument("--skew", type=float, default=1.0, help="stages: Zipf exponent (0 = uniform)")
+    p.add_argument("--seed", type=int, default=1, help="stages: corpus random seed")
+    p.add_argument("--engine", default="lines", help="stages: engine for the end-to-end run")
+    p.add_argument("--history", default="bench_history.json", help="stages: JSON history file")
+    p.add_argument("--threshold", type=float, default=0.10, help="stages: slowdown that counts as a regression")
+    p.add_argument("--profile", action="store_true", help="stages: print cProfile and tracemalloc hot spots")
+    return p.parse_args(argv)
+
+if __name__ == "__main__":
+    opts = parse_args(sys.argv[1:])
+    failed = False
+    for name in opts.names or BENCHES:
+        if name not in BENCHES:
+            sys.exit(f"Unknown benchmark: {name}")
+        if name == "stages":
+            failed = bool(bench_stages(opts)) or failed
+        else:
+            BENCHES[name]()
+    sys.exit(1 if failed else 0)
@@ -1,11 +1,23 @@
+import io
 import os
 import json
+import wc0_fixed
+from contextlib import redirect_stdout
 from wc0_fixed import (
     clean_word,
     count_words,
+    count_incremental,
+    count_corpus,
     to_json,
     to_csv,
     report,
+    load_stopwords,
+    load_config,
+    LazyConfig,
+    WordCounter,
+    get_sort_key,
+    sort_words,
+    top_words,
     CONFIG,
     obj
 )
@@ -48,6 +60,203 @@ def test_count_words():
     os.remove(tmp_file)
     os.remove(tmp_stopwords)
 
+def test_stopword_index():
+    tmp_file = "tmp_test.txt"
+    tmp_stopwords = "tmp_stopwords.txt"
+
+    with open(tmp_file, "w") as f:
+        f.write("the cat and the dog\n")
+
+    with open(tmp_stopwords, "w") as f:
+        f.write("the\nand\n")
+
+    index = load_stopwords(tmp_stopwords)
+    assert index == frozenset({"the", "and"})
+    assert load_stopwords(tmp_stopwords) is index
+    assert count_words(tmp_file, index).counts == {"cat": 1, "dog": 1}
+
+    # editing the file (new mtime) must reload the index
+    with open(tmp_stopwords, "w") as f:
+        f.write("cat\n")
+    st = os.stat(tmp_stopwords)
+    os.utime(tmp_stopwords, ns=(st.st_atime_ns, st.st_mtime_ns + 10**9))
+    assert load_stopwords(tmp_stopwords) == frozenset({"cat"})
+
+    os.remove(tmp_file)
+    os.remove(tmp_stopwords)
+
+def test_parallel_matches_serial():
+    tmp_file = "tmp_test.txt"
+
+    with open(tmp_file, "w") as f:
+        for i in range(500):
+            f.write(f"the cat{i % 7} and, the dog{i % 13}! w{i}\n")
+
+    with ConfigOverride(parallel={"workers": 1, "min_bytes": 0}):
+        serial = count_words(tmp_file, workers=1)
+        for workers in (2, 3, 8):
+            par = count_words(tmp_file, workers=workers)
+            assert par.counts == serial.counts
+            assert par.sorted_words == serial.sorted_words
+
+    os.remove(tmp_file)
+
+def test_mmap_matches_lines():
+    tmp_file = "tmp_test.txt"
+
+    with open(tmp_file, "w") as f:
+        f.write("The CAT, and the dog!\n\"quoted\" (x) ... --\x1fsep\n")
+        f.write("Straße ÉCOLE école, the\u00a0cat\n")
+
+    for path in ["essay.txt", "before.txt", "after.txt", "config.yaml", tmp_file]:
+        lines = count_words(path, engine="lines")
+        fast = count_words(path, engine="mmap")
+        assert fast.counts == lines.counts
+        assert fast.sorted_words == lines.sorted_words
+
+    os.remove(tmp_file)
+
+def test_top_words_matches_full_sort():
+    counts = {f"w{i % 37}x{i}": i % 5 for i in range(200)}
+
+    for policy in ("word", "count"):
+        for reverse in (True, False):
+            key = get_sort_key(policy)
+            full = sort_words(counts, key, reverse)
+            for n in (1, 3, 10, 199, 200, 500):
+                assert top_words(counts, key, reverse, n) == full[:n]
+            assert top_words(counts, key, reverse, "all") == full
+
+def test_incremental_matches_full_count():
+    tmp_file = "tmp_test.txt"
+    tmp_store = "tmp_store.sqlite"
+
+    def check():
+        inc = count_incremental(tmp_file, store=tmp_store, top_n="all")
+        full = count_words(tmp_file, workers=1, top_n="all")
+        assert inc.counts == full.counts
+        assert inc.sorted_words == full.sorted_words
+
+    with open(tmp_file, "w") as f:
+        f.write("the cat and the dog\nbird bird cat\nunfinished lin")
+    check()
+    check()  # unchanged file: nothing new to count
+
+    with open(tmp_file, "a") as f:
+        f.write("e here\ncat fish\n")
+    check()
+
+    with open(tmp_file, "w") as f:  # rewritten, not appended
+        f.write("zebra zebra\n")
+    check()
+
+    # edited in the middle, same length: not an append
+    lines = [f"alpha{i} gamma\n" for i in range(2000)]
+    with open(tmp_file, "w") as f:
+        f.writelines(lines)
+    check()
+    lines[1000] = "alpha1000 delta\n"
+    with open(tmp_file, "w") as f:
+        f.writelines(lines)
+    check()
+
+    os.remove(tmp_file)
+    os.remove(tmp_store)
+
+def test_corpus_spills_and_merges():
+    tmp_dir = "tmp_corpus"
+    os.makedirs(f"{tmp_dir}/sub", exist_ok=True)
+    texts = ["the cat and the dog\n", "Dog, bird! cat\nfish fish\n", "eel cat bird\n"]
+    paths = [f"{tmp_dir}/f0.txt", f"{tmp_dir}/f1.txt", f"{tmp_dir}/sub/f2.txt"]
+    for path, text in zip(paths, texts):
+        with open(path, "w") as f:
+            f.write(text)
+
+    with open("tmp_test.txt", "w") as f:
+        f.write("".join(texts))
+    whole = count_words("tmp_test.txt", top_n="all")
+
+    # everything fits: same result as one big file
+    res = count_corpus(tmp_dir, max_words=100, top_n="all")
+    assert res.counts == whole.counts
+    assert res.sorted_words == whole.sorted_words
+
+    # tiny budget: sorted runs are spilled and k-way merged
+    res = count_corpus(f"{tmp_dir}/**/*.txt", max_words=2, top_n=3)
+    assert dict(res.counts.items()) == whole.counts
+    assert len(res.counts) == len(whole.counts)
+    assert res.sorted_words == sorted(whole.counts.items(), key=lambda x: (-x[1], x[0]))[:3]
+
+    # recursive glob: directories it matches are skipped
+    res = count_corpus(f"{tmp_dir}/**", max_words=100, top_n="all")
+    assert res.counts == whole.counts
+
+    # one long line with no newline: the budget holds per token, runs merge a few at a time
+    with open(f"{tmp_dir}/long.txt", "w") as f:
+        f.write(" ".join(f"w{i % 300}" for i in range(900)))
+    fan_in, wc0_fixed.SPILL_FAN_IN = wc0_fixed.SPILL_FAN_IN, 4
+    try:
+        res = count_corpus(f"{tmp_dir}/long.txt", max_words=20, top_n="all")
+    finally:
+        wc0_fixed.SPILL_FAN_IN = fan_in
+    assert len(res.counts.runs) <= 4
+    assert res.sorted_words == sorted((f"w{i}", 3) for i in range(300))
+    assert (res.counts.total, res.counts.unique) == (900, 300)
+    os.remove(f"{tmp_dir}/long.txt")
+
+    for path in paths:
+        os.remove(path)
+    os.rmdir(f"{tmp_dir}/sub")
+    os.rmdir(tmp_dir)
+    os.remove("tmp_test.txt")
+
+def test_approx_engine_bounds():
+    tmp_file = "tmp_test.txt"
+
+    with open(tmp_file, "w") as f:
+        for i in range(300):
+            f.write(f"common common rare{i} mid{i % 10}\n")
+
+    exact = count_words(tmp_file, top_n="all").counts
+    approx_cfg = {"epsilon": 0.01, "delta": 0.01, "capacity": 20}
+    with ConfigOverride(approx=approx_cfg):
+        res = count_words(tmp_file, engine="approx", top_n=5)
+
+    assert res.approx.total == sum(exact.values())
+    assert [w for w, _ in res.sorted_words[:1]] == ["common"]
+    for word, n in res.counts.items():
+        assert exact.get(word, 0) <= n <= exact.get(word, 0) + res.approx.error
+    assert len(res.counts) <= 20
+
+    os.remove(tmp_file)
+
+def test_pipelines_with_different_configs():
+    lazy = LazyConfig("tmp_missing_config.yaml")  # nothing is read until first use
+    try:
+        lazy["top_n"]
+        assert False, "expected the missing file to be read on first use"
+    except FileNotFoundError:
+        pass
+
+    by_count = WordCounter(load_config())
+    cfg = load_config()
+    cfg["sorting"] = {"key": "word", "reverse": False}
+    cfg["top_n"] = 3
+    by_word = WordCounter(cfg)
+
+    a = by_count.count("essay.txt")
+    b = by_word.count("essay.txt")
+    assert a.counts == b.counts
+    assert b.sorted_words == sorted(b.counts.items())
+    assert a.sorted_words == count_words("essay.txt").sorted_words
+    assert by_word.to_csv(b).count("\n") == 3
+
+    # the model keeps the full ranking; each presenter picks its own top_n
+    res = count_words("essay.txt")
+    assert len(res.sorted_words) == len(res.counts)
+    with ConfigOverride(top_n=25):
+        assert len(json.loads(to_json(res))["top"]) == 25
+
 def test_to_json():
     with ConfigOverride(top_n=1):
         res = obj(file="x", counts={"a": 1}, sorted_words=[("a", 1)])
@@ -65,10 +274,41 @@ def test_to_csv():
         assert "rank,word,count" in csv_output
         assert "1,a,1" in csv_output
 
+def test_streaming_writers_match_dumps():
+    for top in ([], [("a", 1)], [("é\"x", 3), ("b", 2), ("c", 1)]):
+        for file in ("x", ["a.txt", "b.txt"]):
+            res = obj(file=file, counts=dict(top), sorted_words=top)
+            with ConfigOverride(top_n="all"):
+                expected = json.dumps({"file": file, "top": top}, indent=2)
+                assert to_json(res) == expected
+                rows = ["rank,word,count"] + [f"{i},{w},{c}" for i, (w, c) in enumerate(top, 1)]
+                assert to_csv(res) == "\n".join(rows)
+
+def test_bars_are_scaled():
+    res = obj(file="x", counts={"a": 1000, "b": 10}, sorted_words=[("a", 1000), ("b", 10)])
+    out = io.StringIO()
+    cfg = load_config()
+    cfg["formatting"]["bar_width"] = 20
+    with redirect_stdout(out):
+        WordCounter(cfg).print_words(res.counts, res.sorted_words)
+    lines = out.getvalue().splitlines()
+    assert lines[0].endswith(" " + "*" * 20)
+    assert lines[1].endswith(" *")
+
 if __name__ == "__main__":
     test_clean_word()
     test_count_words()
+    test_stopword_index()
+    test_parallel_matches_serial()
+    test_mmap_matches_lines()
+    test_top_words_matches_full_sort()
+    test_incremental_matches_full_count()
+    test_corpus_spills_and_merges()
+    test_approx_engine_bounds()
+    test_pipelines_with_different_configs()
     test_to_json()
     test_to_csv()
+    test_streaming_writers_match_dumps()
+    test_bars_are_scaled()
     print("All tests passed!")
 
@@ -1,38 +1,86 @@
 #!/usr/bin/env python3 -B
 """Word frequency counter - the cleaned version"""
+import os
+import sys
+import glob
 import json
 import yaml
+import math
+import mmap
+import random
+import heapq
+import sqlite3
+import hashlib
+import tempfile
+import io
+import copy
+import locale
+from array import array
+from operator import itemgetter
+from itertools import repeat, groupby, islice
+from collections.abc import Mapping, Sequence
+from contextlib import closing
+from collections import Counter, UserDict
+from concurrent.futures import ProcessPoolExecutor
 from types import SimpleNamespace as obj
 
 #--- Q3: Policy (data - easy to change) ---
 #--- AQ3: All configs are moved to YAML to seperate policy from mechanism
 config_file = "config.yaml"
-with open(config_file, 'r') as file:
-  CONFIG = yaml.load(file, Loader=yaml.FullLoader)
+_CONFIGS = {}  # path -> (mtime_ns, dict)
+
+def load_config(path=config_file):
+  # Parsed once per path and mtime (like the stopword index); callers get their own copy
+  mtime = os.stat(path).st_mtime_ns
+  hit = _CONFIGS.get(path)
+  if not (hit and hit[0] == mtime):
+    with open(path, 'r') as file:
+      hit = _CONFIGS[path] = (mtime, yaml.load(file, Loader=yaml.FullLoader))
+  return copy.deepcopy(hit[1])
+
+class LazyConfig(UserDict):
+  # The default CONFIG: importing the module does no I/O, the YAML is read on first use
+  def __init__(self, path=config_file):
+    self.path, self._data = path, None
+
+  @property
+  def data(self):
+    if self._data is None: self._data = load_config(self.path)
+    return self._data
+
+CONFIG = LazyConfig(config_file)
 
 #--- Q1: Model (pure business logic, no I/O) ---
 #--- AQ1: Model code only performs computation and does no presentation
-def count_words(file="essay.txt"):
-  # AQ2: Orchestrates the counting process using smaller helper functions
-  counts = {}
-  
-  # AQ1: File I/O is localized and streamed here
-  with open(file) as f:
-    for line in f:
-      words = line.split()
-      
-      for word in words:
-        # AQ4: Transformations are handled by seperate functions
-        word = normalize_word(word)
-        word = clean_word(word, CONFIG['punctuation'])
-        if is_valid_word(word, CONFIG['stopwords_files'][CONFIG['language']]):
-          increment(counts, word)
-  
-  # AQ3: Sorting rules are loaded in from CONFIG
-  # AQ4: Sorting logic is extracted
-  sorted_words = sort_words(counts, get_sort_key(CONFIG["sorting"]["key"]), CONFIG["sorting"]["reverse"])
-  
-  return obj(file=file, counts=counts, sorted_words=sorted_words)
+def count_words(file="essay.txt", stopwords=None, workers=None, engine=None, top_n=None):
+  # Module-level API; the work is done by a pipeline compiled from CONFIG
+  return pipeline().count(file, stopwords, workers, engine, top_n)
+
+def pipeline():
+  # Built per call so in-place CONFIG edits are seen; stopwords and YAML stay cached
+  return WordCounter(CONFIG)
+
+def count_incremental(file, store=None, stopwords=None, engine=None, top_n=None):
+  # Only bytes past each file's checkpoint are counted; totals come from the store
+  return pipeline().incremental(file, store, stopwords, engine, top_n)
+
+def count_corpus(source, stopwords=None, max_words=None, top_n=None, spill_dir=None):
+  # One pipeline over every file; at most max_words distinct words are held in memory
+  return pipeline().corpus(source, stopwords, max_words, top_n, spill_dir)
+
+def count_lines(lines, stopwords, punctuation, counts=None):
+  # The per-token pipeline, shared by the serial and sharded paths
+  counts = {} if counts is None else counts
+  for line in lines:
+    words = line.split()
+    
+    for word in words:
+      # AQ4: Transformations are handled by seperate functions
+      word = normalize_word(word)
+      word = clean_word(word, punctuation)
+      if is_valid_word(word, stopwords):
+        increment(counts, word)
+  return counts
 
 # AQ2: Small, single-purpose functions
 def normalize_word(word): 
@@ -43,17 +91,19 @@ def clean_word(word, punctuation):
 
 def is_valid_word(word, stopwords): 
   # AQ3: Stopword list is externalized to a file and loaded from a CONFIG.
-  # AQ4: The stopwords are streamed rather than being loaded. 
-  with open(stopwords, 'r') as file:
-    for line in file:
-      line = line.strip()
-      if line == word:
-        return False
-  return True
+  # Accepts a path (looked up in the cached index) or a prebuilt set.
+  if isinstance(stopwords, str): stopwords = load_stopwords(stopwords)
+  return word not in stopwords
 
 def increment(counts, word): 
   counts[word] = counts.get(word, 0) + 1
 
+def merge_counts(counts, more):
+  # Shards are merged in file order, so first-seen order (and sort ties) match a serial run
+  for word, n in more.items():
+    counts[word] = counts.get(word, 0) + n
+  return counts
+
 def get_sort_key(policy):
   # AQ3: Interprets sorting policy as data and maps to behavior
   if policy == "word": 
@@ -66,6 +116,438 @@ def sort_words(counts, key, reverse):
   # AQ3: Behavior is controlled by and injected policy
   return sorted(counts.items(), key=key, reverse=reverse)
 
+def top_words(counts, key, reverse, n): 
+  # Bounded-heap selection, O(V log n); same order (ties included) as sort_words(...)[:n]
+  n = top_limit(n)
+  if n is None or n >= len(counts): 
+    return sort_words(counts, key, reverse)
+  pick = heapq.nlargest if reverse else heapq.nsmallest
+  return pick(n, counts.items(), key=key)
+
+def top_limit(n):
+  # top_n may be a number or "all"
+  return None if n == "all" else n
+
+class Ranking(Sequence):
+  # The full ranking of counts, sorted only when it is indexed, iterated or compared;
+  # presenters take top(n), a bounded-heap selection of the first n entries
+  def __init__(self, counts, key, reverse):
+    self.counts, self.key, self.reverse = counts, key, reverse
+    self.all, self.tops = None, {}
+
+  def top(self, n):
+    n = top_limit(n)
+    if self.all is not None: return self.all[:n]
+    if n not in self.tops:
+      if isinstance(self.counts, dict): self.tops[n] = top_words(self.counts, self.key, self.reverse, n)
+      else: self.tops[n] = top_stream(self.counts.items(), self.key, self.reverse, n)
+    return self.tops[n]
+
+  def ranked(self):
+    if self.all is None: self.all = self.top(None)
+    return self.all
+
+  def __getitem__(self, i): return self.ranked()[i]
+  def __len__(self): return len(self.ranked())
+  def __iter__(self): return iter(self.ranked())
+  def __eq__(self, other): return isinstance(other, (list, Ranking)) and list(self) == list(other)
+  def __repr__(self): return repr(self.ranked())
+
+def head(sorted_words):
+  # Presenters only ever show the first top_n entries
+  return pipeline().head(sorted_words)
+
+def word_totals(counts):
+  # (total words, unique words); a SpilledCounts already knows both from the merge that ranked it
+  if getattr(counts, "total", None) is not None: return counts.total, counts.unique
+  return sum(counts.values()), len(counts)
+
+def top_stream(items, key, reverse, n):
+  # Like top_words but over an iterator; ties keep the iterator's (alphabetical) order
+  n = top_limit(n)
+  if n is None: return sorted(items, key=key, reverse=reverse)
+  return (heapq.nlargest if reverse else heapq.nsmallest)(n, items, key=key)
+
+# Approximate counts in fixed memory: Count-Min Sketch + Space-Saving
+class CountMinSketch:
+  # depth rows of width counters; estimates never undercount and overcount by
+  # at most epsilon * total with probability 1 - delta
+  PRIME = (1 << 61) - 1
+
+  def __init__(self, epsilon, delta, seed=1):
+    self.width = math.ceil(math.e / epsilon)
+    self.depth = math.ceil(math.log(1 / delta))
+    rng = random.Random(seed)
+    self.hashes = [(rng.randrange(1, self.PRIME), rng.randrange(self.PRIME)) for _ in range(self.depth)]
+    self.rows = [array('Q', bytes(8 * self.width)) for _ in range(self.depth)]
+    self.total = 0
+
+  def cells(self, word):
+    # A stable digest, not hash(): str hashes change per process (PYTHONHASHSEED)
+    h = int.from_bytes(hashlib.blake2b(word.encode('utf-8'), digest_size=8).digest(), 'little')
+    p, w = self.PRIME, self.width
+    return [(a * h + b) % p % w for a, b in self.hashes]
+
+  def add(self, word, n=1):
+    # Conservative update: only raise the cells that are at the current minimum
+    self.total += n
+    cells = self.cells(word)
+    new = min(row[c] for row, c in zip(self.rows, cells)) + n
+    for row, c in zip(self.rows, cells):
+      if row[c] < new: row[c] = new
+    return new
+
+  def estimate(self, word):
+    return min(row[c] for row, c in zip(self.rows, self.cells(word)))
+
+  def nbytes(self):
+    return sum(row.itemsize * len(row) for row in self.rows)
+
+class SpaceSaving:
+  # Keeps `capacity` candidate heavy hitters; a new word evicts the current minimum
+  def __init__(self, capacity):
+    self.capacity, self.counts, self.heap = capacity, {}, []
+
+  def add(self, word, n=1):
+    counts = self.counts
+    if word in counts:
+      counts[word] += n
+      return
+    if len(counts) < self.capacity:
+      counts[word] = n
+      heapq.heappush(self.heap, (n, word))
+      return
+    low, _ = self.pop_min()
+    counts[word] = low + n
+    heapq.heappush(self.heap, (low + n, word))
+
+  def pop_min(self):
+    # Heap entries go stale as counts grow; refresh them until the top one is current
+    while True:
+      n, word = heapq.heappop(self.heap)
+      if self.counts[word] == n:
+        del self.counts[word]
+        return n, word
+      heapq.heappush(self.heap, (self.counts[word], word))
+
+def count_approx(lines, stopwords, punctuation, epsilon, delta, capacity):
+  # Returns (estimated counts of the tracked heavy hitters, sketch, tracker)
+  sketch, hitters = CountMinSketch(epsilon, delta), SpaceSaving(capacity)
+  for line in lines:
+    for word in line.split():
+      word = clean_word(normalize_word(word), punctuation)
+      if is_valid_word(word, stopwords):
+        sketch.add(word)
+        hitters.add(word)
+  # Both structures overestimate, so the smaller of the two is the tighter count
+  counts = {w: min(n, sketch.estimate(w)) for w, n in hitters.counts.items()}
+  return counts, sketch, hitters
+
+#--- Engines and storage (file, mmap, process, sqlite and temp-file I/O) ---
+def count_file_lines(file, stopwords, punctuation, start=0, end=None):
+  # AQ1: File I/O is localized and streamed here
+  if end is not None: 
+    return count_lines(read_range(file, start, end), stopwords, punctuation)
+  with open(file) as f:
+    return count_lines(f, stopwords, punctuation)
+
+# mmap engine: bulk lower/split/strip over bytes, same counts as count_lines
+MMAP_CHUNK = 1 << 20
+# str.split() also breaks on \x1c-\x1f, bytes.split() does not; fold them to spaces while lowering
+_LOWER = bytes.maketrans(bytes(range(65, 91)) + b"\x1c\x1d\x1e\x1f", bytes(range(97, 123)) + b"    ")
+
+def count_mmap(file, stopwords, punctuation, start=0, end=None):
+  # Tokens are counted as bytes; str objects are only made for distinct words that survive
+  size = os.path.getsize(file)
+  end = size if end is None else end
+  total = Counter()
+  if start >= end: return {}
+  with open(file, 'rb') as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+    for chunk in mmap_chunks(mm, start, end):
+      total.update(count_chunk(chunk, punctuation))
+  counts = {}
+  for key, n in total.items():
+    word = key.decode('utf-8')
+    if is_valid_word(word, stopwords):
+      counts[word] = n
+  return counts
+
+def mmap_chunks(mm, start, end):
+  # Chunks end just after a newline, so no token is split across two chunks
+  while start < end:
+    cut = mm.find(b"\n", min(start + MMAP_CHUNK, end) - 1, end)
+    cut = end if cut < 0 else cut + 1
+    yield mm[start:cut]
+    start = cut
+
+def count_chunk(chunk, punctuation):
+  if chunk.isascii():
+    strip = punctuation.encode('ascii', 'ignore')
+    return Counter(map(bytes.strip, chunk.translate(_LOWER).split(), repeat(strip)))
+  # Non-ASCII text needs str.lower(); keys are re-encoded so all chunks share one key space
+  text = chunk.decode(locale.getpreferredencoding(False))
+  words = Counter(map(str.strip, text.lower().split(), repeat(punctuation)))
+  return {w.encode('utf-8'): n for w, n in words.items()}
+
+# Stopword index: each list is read once, O(1) membership
+_STOPWORDS = {}  # path -> (mtime_ns, frozenset)
+
+def load_stopwords(path):
+  # Cached by path and mtime, so editing the file triggers a reload
+  mtime = os.stat(path).st_mtime_ns
+  hit = _STOPWORDS.get(path)
+  if hit and hit[0] == mtime: 
+    return hit[1]
+  with open(path, 'r') as file:
+    words = frozenset(line.strip() for line in file)
+  _STOPWORDS[path] = (mtime, words)
+  return words
+
+def stopword_index(language=None, config=None):
+  # Language defaults to the one chosen in CONFIG
+  config = CONFIG if config is None else config
+  return load_stopwords(config['stopwords_files'][language or config['language']])
+
+# Parallel counting: byte-range shards, one process per shard
+def use_parallel(file, workers, min_bytes=0):
+  return workers != 1 and os.path.getsize(file) >= min_bytes
+
+def shard_ranges(file, n):
+  # Split into n byte ranges whose cut points sit just after a newline
+  size = os.path.getsize(file)
+  cuts = [0]
+  with open(file, 'rb') as f:
+    for k in range(1, n):
+      f.seek(max(size * k // n, cuts[-1]))
+      f.readline()
+      cuts.append(min(f.tell(), size))
+  cuts.append(size)
+  return [(a, b) for a, b in zip(cuts, cuts[1:]) if b > a]
+
+def read_range(file, start, end):
+  # Yields decoded lines in [start, end); start is always a line boundary
+  encoding = locale.getpreferredencoding(False)
+  with open(file, 'rb') as f:
+    f.seek(start)
+    while start < end:
+      line = f.readline()
+      if not line: break
+      start += len(line)
+      yield line.decode(encoding)
+
+def count_shard(args):
+  file, start, end, stopwords, punctuation, engine = args
+  return ENGINES[engine](file, stopwords, punctuation, start, end)
+
+def count_parallel(file, stopwords, punctuation, workers, engine="lines"):
+  workers = workers or os.cpu_count()
+  shards = [(file, a, b, stopwords, punctuation, engine) for a, b in shard_ranges(file, workers)]
+  counts = {}
+  with ProcessPoolExecutor(max_workers=len(shards) or 1) as pool:
+    for part in pool.map(count_shard, shards):
+      merge_counts(counts, part)
+  return counts
+
+# Counting engines by name (CONFIG "engine"); all return the same counts dict
+ENGINES = {"lines": count_file_lines, "mmap": count_mmap}
+
+# Incremental counting: per-file checkpoints in an sqlite store
+STORE_SCHEMA = """
+CREATE TABLE IF NOT EXISTS meta  (key TEXT PRIMARY KEY, value TEXT);
+CREATE TABLE IF NOT EXISTS words (id INTEGER PRIMARY KEY, word TEXT UNIQUE);
+CREATE TABLE IF NOT EXISTS files (id INTEGER PRIMARY KEY, path TEXT UNIQUE,
+  offset INTEGER, size INTEGER, mtime_ns INTEGER, digest TEXT);
+CREATE TABLE IF NOT EXISTS counts (file_id INTEGER, word_id INTEGER, n INTEGER,
+  PRIMARY KEY (file_id, word_id)) WITHOUT ROWID;
+"""
+DIGEST_CHUNK = 1 << 20
+
+
+def incremental_counts(paths, store, stopwords, punctuation, engine):
+  # Checkpoints each path, then totals from the store plus any unfinished last lines
+  with closing(sqlite3.connect(store)) as db:
+    open_store(db, store_signature(stopwords, punctuation))
+    tails = {}
+    for path in paths:
+      merge_counts(tails, checkpoint_file(db, path, stopwords, punctuation, engine))
+    counts = stored_counts(db, paths)
+  return merge_counts(counts, tails)
+
+def store_signature(stopwords, punctuation):
+  # Counts depend on stopwords and punctuation; if either changes the store is rebuilt
+  text = punctuation + "\0" + "\n".join(sorted(stopwords))
+  return hashlib.sha1(text.encode('utf-8')).hexdigest()
+
+def open_store(db, signature):
+  db.executescript(STORE_SCHEMA)
+  row = db.execute("SELECT value FROM meta WHERE key = 'signature'").fetchone()
+  if row and row[0] != signature:
+    db.executescript("DELETE FROM counts; DELETE FROM files; DELETE FROM words;")
+  db.execute("INSERT OR REPLACE INTO meta VALUES ('signature', ?)", (signature,))
+  db.commit()
+
+def file_digest(path, end, h=None, start=0):
+  # sha1 of the whole processed prefix: bytes [start, end) fed into h, so a prefix
+  # that was just verified is extended over the new bytes without rereading it
+  h = h or hashlib.sha1()
+  with open(path, 'rb') as f:
+    f.seek(start)
+    left = end - start
+    while left > 0 and (chunk := f.read(min(left, DIGEST_CHUNK))):
+      h.update(chunk)
+      left -= len(chunk)
+  return h
+
+def last_line_end(path, start, size):
+  # Offset just past the last newline in [start, size), or start if there is none
+  with open(path, 'rb') as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+    return mm.rfind(b"\n", start, size) + 1 or start
+
+def checkpoint_file(db, path, stopwords, punctuation, engine):
+  # Commits counts for complete new lines; returns counts for an unfinished last line
+  st = os.stat(path)
+  row = db.execute("SELECT id, offset, size, mtime_ns, digest FROM files WHERE path = ?", (path,)).fetchone()
+  if row is None:
+    file_id = db.execute("INSERT INTO files (path, offset, size, mtime_ns, digest) VALUES (?, 0, 0, 0, '')", (path,)).lastrowid
+    offset, h = 0, hashlib.sha1()
+  else:
+    file_id, offset, size, mtime_ns, digest = row
+    if (st.st_size, st.st_mtime_ns) == (size, mtime_ns) and offset == size:
+      return {}
+    h = file_digest(path, offset) if st.st_size >= offset else None
+    if h is None or h.hexdigest() != digest:
+      db.execute("DELETE FROM counts WHERE file_id = ?", (file_id,))
+      # Orphaned words go too, so the recount assigns first-seen ids (tie order) afresh
+      db.execute("DELETE FROM words WHERE id NOT IN (SELECT word_id FROM counts)")
+      offset, h = 0, hashlib.sha1()
+  end = last_line_end(path, offset, st.st_size) if st.st_size > offset else offset
+  if end > offset:
+    store_counts(db, file_id, ENGINES[engine](path, stopwords, punctuation, offset, end))
+  db.execute("UPDATE files SET offset = ?, size = ?, mtime_ns = ?, digest = ? WHERE id = ?",
+             (end, st.st_size, st.st_mtime_ns, file_digest(path, end, h, offset).hexdigest(), file_id))
+  db.commit()
+  return ENGINES[engine](path, stopwords, punctuation, end, st.st_size) if st.st_size > end else {}
+
+def store_counts(db, file_id, counts):
+  # Words keep their first-seen id, so tie order survives the round trip
+  db.executemany("INSERT OR IGNORE INTO words (word) VALUES (?)", ((w,) for w in counts))
+  db.executemany("""INSERT INTO counts (file_id, word_id, n)
+                    SELECT ?, id, ? FROM words WHERE word = ?
+                    ON CONFLICT (file_id, word_id) DO UPDATE SET n = n + excluded.n""",
+                 ((file_id, n, w) for w, n in counts.items()))
+
+def stored_counts(db, paths):
+  marks = ",".join("?" * len(paths))
+  rows = db.execute(f"""SELECT w.word, SUM(c.n) FROM counts c
+                        JOIN words w ON w.id = c.word_id
+                        JOIN files f ON f.id = c.file_id
+                        WHERE f.path IN ({marks})
+                        GROUP BY c.word_id ORDER BY c.word_id""", paths)
+  return dict(rows)
+
+# Corpus mode: directory, glob or stdin; spills sorted runs to bound memory
+def corpus_files(source):
+  # "-" is stdin, a directory is walked, anything else is a glob pattern
+  if source == "-": return ["-"]
+  if os.path.isdir(source):
+    return sorted(os.path.join(d, f) for d, _, fs in os.walk(source) for f in fs)
+  matches = glob.glob(source, recursive=True)  # "**" also yields the directories
+  return sorted(p for p in matches if os.path.isfile(p)) if matches else [source]
+
+def corpus_lines(paths):
+  # Pieces of about MMAP_CHUNK characters cut after whitespace, not lines: a file
+  # with no newlines is never read whole, and no token is split across pieces
+  for path in paths:
+    if path == "-":
+      yield from text_pieces(sys.stdin)
+    else:
+      with open(path) as f:
+        yield from text_pieces(f)
+
+def text_pieces(f, size=MMAP_CHUNK):
+  tail = ""
+  while chunk := f.read(size):
+    text = tail + chunk
+    cut = len(text)
+    while cut and not text[cut - 1].isspace(): cut -= 1
+    if cut: yield text[:cut]
+    tail = text[cut:]
+  if tail: yield tail
+
+
+def count_spilling(lines, stopwords, punctuation, max_words, spill_dir=None):
+  # Returns a plain dict, or SpilledCounts once more than max_words distinct words were seen;
+  # the limit is checked per token, so one long line cannot outgrow it
+  counts, runs = {}, None
+  for line in lines:
+    for word in line.split():
+      word = clean_word(normalize_word(word), punctuation)
+      if is_valid_word(word, stopwords):
+        increment(counts, word)
+        if len(counts) >= max_words:
+          if runs is None: runs = SpilledCounts(spill_dir)
+          runs.spill(counts)
+          counts = {}
+  if runs is None: return counts
+  runs.spill(counts)
+  return runs
+
+SPILL_FAN_IN = 32  # run files open at once while merging (well under ulimit -n)
+
+class SpilledCounts(Mapping):
+  # Read-only counts spread over sorted run files; items() is a k-way merge
+  def __init__(self, spill_dir=None):
+    self.dir = tempfile.TemporaryDirectory(prefix="wc0_runs_", dir=spill_dir)
+    self.runs, self.made = [], 0
+    self.total = self.unique = None
+
+  def spill(self, counts):
+    self.write_run(sorted(counts.items()))
+
+  def write_run(self, items):
+    path = os.path.join(self.dir.name, f"run{self.made:05}.txt")
+    self.made += 1
+    with open(path, "w", encoding="utf-8") as f:
+      f.writelines(f"{w}\t{n}\n" for w, n in items)
+    self.runs.append(path)
+    self.total = self.unique = None
+
+  def read_run(self, path):
+    with open(path, encoding="utf-8") as f:
+      for line in f:
+        w, n = line.rstrip("\n").rsplit("\t", 1)
+        yield w, int(n)
+
+  def merged(self, paths):
+    merged = heapq.merge(*[self.read_run(p) for p in paths])
+    return ((w, sum(n for _, n in group)) for w, group in groupby(merged, key=itemgetter(0)))
+
+  def collapse(self):
+    # Merge SPILL_FAN_IN runs at a time into intermediate runs until one pass can finish
+    while len(self.runs) > SPILL_FAN_IN:
+      batch, self.runs = self.runs[:SPILL_FAN_IN], self.runs[SPILL_FAN_IN:]
+      self.write_run(self.merged(batch))
+      for path in batch: os.remove(path)
+
+  def items(self):
+    self.collapse()
+    total = unique = 0
+    for w, n in self.merged(self.runs):
+      total += n
+      unique += 1
+      yield w, n
+    self.total, self.unique = total, unique  # a full pass also answers len() and the total
+
+  def values(self): return (n for _, n in self.items())
+  def __iter__(self): return (w for w, _ in self.items())
+  def __getitem__(self, word):
+    for w, n in self.items():
+      if w == word: return n
+    raise KeyError(word)
+  def __len__(self):
+    if self.unique is None: self.unique = sum(1 for _ in self.items())
+    return self.unique
+
 #--- Q1: Presentation (I/O only, no logic) ---
 #--- AQ1: All printing functions are placed here
 def print_header(file):
@@ -73,52 +555,226 @@ def print_header(file):
   print(f"WORD FREQUENCY ANALYSIS - {file}")
   print(f"{'='*50}\n")
 
-def print_results(counts):
-  print(f"Total words (after removing stopwords): {sum(counts.values())}")
-  print(f"Unique words: {len(counts)}\n")
-  print(f"Top {CONFIG['top_n']} most frequent words:\n")
+def print_results(counts, approx=None):
+  pipeline().print_results(counts, approx)
 
 def print_words(count, sorted_words):
-  # AQ3: Formatting widths are configurable via the CONFIG file
-  for i,(word, count) in enumerate(results.sorted_words[:CONFIG["top_n"]], 1):
-    bar = "*" * count
-    print(f"{i:{CONFIG['formatting']['i_pad']}}. {word:{CONFIG['formatting']['word_pad']}} {count:{CONFIG['formatting']['count_pad']}} {bar}")
-
-  print()
+  pipeline().print_words(count, sorted_words)
 
 def to_json(results):
   #AQ1: Alternate presentation format (JSON)
-  return json.dumps({"file": results.file, "top": results.sorted_words[:CONFIG["top_n"]]}, indent=2)
+  return pipeline().to_json(results)
 
 def to_csv(results):
   #AQ1: Alternate presentation format (CSV)
-  rows=["rank,word,count"]
-  for i,(w,c) in enumerate(results.sorted_words[:CONFIG["top_n"]],1):
-    rows.append(f"{i},{w},{c}")
-  return "\n".join(rows)
+  return pipeline().to_csv(results)
 
 def write_json_file(results):
-  # AQ1: File output is isolated from model logic
-  path = f"{CONFIG['output']['output_dir']}/{CONFIG['output']['output_json']}"
-  with open(path, "w") as f: 
-    f.write(to_json(results))
+  pipeline().write_json_file(results)
 
 def write_csv_file(results):
-  # AQ1: File output is isolated from model logic
-  path = f"{CONFIG['output']['output_dir']}/{CONFIG['output']['output_csv']}"
-  with open(path, "w") as f: 
-    f.write(to_csv(results))
+  pipeline().write_csv_file(results)
 
 def report(results):
-  # AQ2: Responsible only for coordinating presentation
-  if CONFIG["output"]["format"] == "text": 
-    print_header(results.file)
-    print_results(results.counts)
-    print_words(results.counts, results.sorted_words)
-  elif CONFIG["output"]["format"] == "json": 
-    print(to_json(results, config))
-  elif CONFIG["output"]["format"] == "csv": 
-    print(to_csv(results, config))
+  pipeline().report(results)
+
+#--- Compiled pipeline (one config, parsed and compiled once, reusable) ---
+class WordCounter:
+  # Everything derived from the config is resolved here, once; two pipelines
+  # with different configs can run side by side in one process
+  def __init__(self, config=None):
+    config = CONFIG if config is None else config
+    self.config = config
+    self.punctuation = config['punctuation']
+    self.stopwords = stopword_index(config=config)
+    self.key = get_sort_key(config["sorting"]["key"])
+    self.reverse = config["sorting"]["reverse"]
+    self.top_n = config["top_n"]
+    self.engine = config.get('engine', 'lines')
+    parallel = config.get('parallel', {})
+    self.workers, self.min_bytes = parallel.get('workers', 1), parallel.get('min_bytes', 0)
+    self.approx_cfg = config.get('approx', {})
+    self.corpus_cfg = config.get('corpus', {})
+    self.store = config.get('incremental', {}).get('store')
+    fmt, out = config['formatting'], config['output']
+    # AQ3: Formatting widths are compiled into one format string
+    self.row = f"{{:{fmt['i_pad']}}}. {{:{fmt['word_pad']}}} {{:{fmt['count_pad']}}} {{}}".format
+    self.format = out['format']
+    self.bar_width = fmt.get('bar_width', 50)
+    self.buffering = out.get('buffer_bytes', 1 << 20)
+    self.json_path = f"{out['output_dir']}/{out['output_json']}"
+    self.csv_path = f"{out['output_dir']}/{out['output_csv']}"
+
+  # Counting and ranking
+  def count(self, file="essay.txt", stopwords=None, workers=None, engine=None, top_n=None):
+    # AQ2: Orchestrates the counting process using smaller helper functions
+    # Parallelism and engine are policy; the arguments win over the config
+    stopwords = self.stopwords if stopwords is None else stopwords
+    workers = self.workers if workers is None else workers
+    engine = engine or self.engine
+    if engine == "approx": return self.count_approx(file, stopwords, top_n)
+    if engine not in ENGINES: raise ValueError(f"Unknown engine: {engine}")
+    
+    if use_parallel(file, workers, self.min_bytes):
+      counts = count_parallel(file, stopwords, self.punctuation, workers, engine)
+    else:
+      counts = ENGINES[engine](file, stopwords, self.punctuation)
+    
+    return obj(file=file, counts=counts, sorted_words=self.rank(counts, top_n))
+
+  def rank(self, counts, top_n=None):
+    # The full ranking, sorted lazily; an explicit top_n ranks just that many ("all" = full sort)
+    ranking = Ranking(counts, self.key, self.reverse)
+    return ranking if top_n is None else ranking.top(top_n)
+
+  def count_approx(self, file, stopwords=None, top_n=None):
+    # Error bounds and tracker size come from the config
+    stopwords = self.stopwords if stopwords is None else stopwords
+    cfg = self.approx_cfg
+    epsilon, delta = cfg.get('epsilon', 1e-4), cfg.get('delta', 0.01)
+    capacity = max(cfg.get('capacity', 1000), top_limit(self.top_n if top_n is None else top_n) or 0)
+    with open(file) as f:
+      counts, sketch, hitters = count_approx(f, stopwords, self.punctuation, epsilon, delta, capacity)
+    approx = obj(total=sketch.total, width=sketch.width, depth=sketch.depth,
+                 capacity=hitters.capacity, error=math.ceil(epsilon * sketch.total))
+    return obj(file=file, counts=counts, sorted_words=self.rank(counts, top_n), approx=approx)
+
+  def incremental(self, file, store=None, stopwords=None, engine=None, top_n=None):
+    stopwords = self.stopwords if stopwords is None else stopwords
+    engine, store = engine or self.engine, store or self.store
+    paths = [file] if isinstance(file, str) else list(file)
+    counts = incremental_counts(paths, store, stopwords, self.punctuation, engine)
+    return obj(file=file, counts=counts, sorted_words=self.rank(counts, top_n))
+
+  def corpus(self, source, stopwords=None, max_words=None, top_n=None, spill_dir=None):
+    stopwords = self.stopwords if stopwords is None else stopwords
+    if max_words is None: max_words = self.corpus_cfg.get('max_words', 1_000_000)
+    if spill_dir is None: spill_dir = self.corpus_cfg.get('spill_dir')
+    lines = corpus_lines(corpus_files(source))
+    counts = count_spilling(lines, stopwords, self.punctuation, max_words, spill_dir)
+    return obj(file=source, counts=counts, sorted_words=self.rank(counts, top_n))
+
+  # Presentation
+  def head(self, sorted_words):
+    # A Ranking selects just the top_n shown; islice, not a slice, for anything else
+    if isinstance(sorted_words, Ranking): return iter(sorted_words.top(self.top_n))
+    return islice(sorted_words, top_limit(self.top_n))
+
+  def print_results(self, counts, approx=None):
+    TextWriter(sys.stdout, self).summary(counts, approx)
+
+  def print_words(self, count, sorted_words):
+    self.write_report(obj(file=None, counts=count, sorted_words=sorted_words), TextWriter(sys.stdout, self, summary=False))
+
+  def to_json(self, results):
+    out = io.StringIO()
+    self.write_report(results, JsonWriter(out))
+    return out.getvalue()
+
+  def to_csv(self, results):
+    out = io.StringIO()
+    self.write_report(results, CsvWriter(out))
+    return out.getvalue()
+
+  def write_json_file(self, results):
+    # AQ1: File output is isolated from model logic
+    with open(self.json_path, "w", buffering=self.buffering) as f: 
+      self.write_report(results, JsonWriter(f))
+
+  def write_csv_file(self, results):
+    # AQ1: File output is isolated from model logic
+    with open(self.csv_path, "w", buffering=self.buffering) as f: 
+      self.write_report(results, CsvWriter(f))
+
+  def report(self, results):
+    # AQ2: Responsible only for coordinating presentation
+    self.write_report(results, self.console())
+    if self.format != "text": print()
+
+  def console(self):
+    if self.format == "text": return TextWriter(sys.stdout, self)
+    if self.format == "json": return JsonWriter(sys.stdout)
+    if self.format == "csv": return CsvWriter(sys.stdout)
+    raise ValueError(f"Unknown output format: {self.format}")
+
+  def write_reports(self, results):
+    # Console report, JSON file and CSV file, all from one pass over sorted_words
+    with open(self.json_path, "w", buffering=self.buffering) as j, \
+         open(self.csv_path, "w", buffering=self.buffering) as c:
+      self.write_report(results, self.console(), JsonWriter(j), CsvWriter(c))
+    if self.format != "text": print()
+
+  def write_report(self, results, *writers):
+    rows = results.sorted_words
+    if any(isinstance(w, TextWriter) for w in writers):
+      rows = list(self.head(rows))  # bars are scaled to the largest count shown
+    for w in writers: w.begin(results, rows)
+    for i, (word, count) in enumerate(self.head(rows), 1):
+      for w in writers: w.row(i, word, count)
+    for w in writers: w.end()
+
+#--- Streaming report writers (rows are written as they are produced) ---
+class TextWriter:
+  def __init__(self, out, counter, summary=True):
+    self.out, self.counter, self.show_summary = out, counter, summary
+
+  def begin(self, results, rows):
+    if self.show_summary:
+      self.out.write(f"\n{'='*50}\nWORD FREQUENCY ANALYSIS - {results.file}\n{'='*50}\n\n")
+      self.summary(results.counts, getattr(results, "approx", None))
+    # Bars longer than bar_width are scaled down instead of printed in full
+    peak = max((c for _, c in rows), default=0)
+    self.scale = max(1, peak / self.counter.bar_width)
+
+  def summary(self, counts, approx=None):
+    out = self.out
+    if approx:
+      # Approximate counts only keep the heavy hitters, not the full vocabulary
+      out.write(f"Total words (after removing stopwords): {approx.total}\n")
+      out.write(f"Approximate counts: within +{approx.error} (sketch {approx.depth}x{approx.width}, {approx.capacity} tracked)\n\n")
+    else:
+      total, unique = word_totals(counts)
+      out.write(f"Total words (after removing stopwords): {total}\n")
+      out.write(f"Unique words: {unique}\n\n")
+    out.write(f"Top {self.counter.top_n} most frequent words:\n\n")
+
+  def row(self, i, word, count):
+    bar = "*" * math.ceil(count / self.scale)
+    self.out.write(self.counter.row(i, word, count, bar) + "\n")
+
+  def end(self):
+    self.out.write("\n")
+
+class JsonWriter:
+  # Byte-for-byte the same layout as json.dumps({"file": ..., "top": [...]}, indent=2)
+  def __init__(self, out):
+    self.out = out
+
+  def begin(self, results, rows):
+    file = json.dumps(results.file, indent=2).replace("\n", "\n  ")
+    self.out.write(f'{{\n  "file": {file},\n  "top": [')
+    self.rows = 0
+
+  def row(self, i, word, count):
+    sep = ",\n" if self.rows else "\n"
+    self.out.write(f"{sep}    [\n      {json.dumps(word)},\n      {json.dumps(count)}\n    ]")
+    self.rows += 1
+
+  def end(self):
+    self.out.write("\n  ]\n}" if self.rows else "]\n}")
+
+class CsvWriter:
+  def __init__(self, out):
+    self.out = out
+
+  def begin(self, results, rows):
+    self.out.write("rank,word,count")
+
+  def row(self, i, word, count):
+    self.out.write(f"\n{i},{word},{count}")
+
+  def end(self):
+    pass
 
 # -- Sample unit tests (from test_wc0.py)
 def test_clean_word(): 
@@ -136,8 +792,12 @@ def run_tests():
 # AQ1: Main logic seperated from model and presentation
 #--- Main ---
 if __name__ == "__main__":
-  results = count_words(CONFIG["input_file"])
-  report(results)
-  write_json_file(results)
-  write_csv_file(results)
+  counter = WordCounter(CONFIG)
+  if CONFIG.get("incremental", {}).get("enabled"):
+    results = counter.incremental(CONFIG["input_file"])
+  elif not os.path.isfile(CONFIG["input_file"]):
+    results = counter.corpus(CONFIG["input_file"])
+  else:
+    results = counter.count(CONFIG["input_file"])
+  counter.write_reports(results)
   run_tests()
@@ -15,13 +15,39 @@ OPTIONS
     -k k=1      Bayes low frequency hack for symbolic attributes.
     -m m=2      Bayes low frequency hack for class priors.
     -w wait=5   Start classifying after seeing "some" rows
+    -o model=nb.model  Model file written by --train, read by --predict.
+    -p procs=1  Worker processes for --train (and --ptrain).
+    -e every=1000  --stream: report running accuracy every e rows.
+    -r recent=0 --stream: stats over the last r rows only (0 = all).
+    -d decay=1  --stream: fade all stats by d per row (1 = never).
+    -s snap=0   --metrics: snapshot metrics every s predictions (0 = never)
+    -S snapto=nb_metrics  Snapshots append to this .jsonl and .csv.
+    -b bins=0   --nb/--stream/--metrics: bin Num x columns into b
+                equal-frequency bins, scored like Sym (0 = Gaussian).
+    -K ks=0,1,2,3      --sweep: values of k to try.
+    -M ms=0,1,2,3      --sweep: values of m to try.
+    -W waits=5,10,20   --sweep: values of wait to try.
+    -c cache=nb_sweep.json  --sweep: results cached by data hash + setting.
 
 EXAMPLES
     --the       Print config settings.
     --sym       Test symbolic column.
     --num       Test numeric column.
-    --csv F     Print rows from CSV file.
+    --csv F     Print rows from CSV file (X columns print as ?).
     --nb F      Run naive bayes on CSV file.
+    --compact F Memory (row lists vs columnar Rows) and nb rows/sec.
+    --batch F   Train on F, score it per row and in numpy blocks.
+    --train F   Train on F, save the model to the -o file.
+    --predict F Load the -o model, score F; report cold start and rows/sec.
+    --cache F   Cached log-space likes() vs recomputing like(); timings.
+    --ingest F  csv() vs split-and-cast(): rows/sec and same rows (X aside)?
+    --ptrain F  train() vs train_parallel() on -p procs: time and same model?
+    --stream F  nb without keeping rows (-e, -r, -d); peak memory.
+    --window F  --stream with windows, decays and both together.
+    --metrics F nb with a Confusion matrix: per-class, macro, micro (-s, -S).
+    --bins F    Gaussian vs binned Num columns: rows/sec, accuracy, macro F1.
+    --sweep F   nb on F for every (k, m, wait) in -K -M -W on -p procs;
+                ranked by accuracy. Reruns only what -c has not seen.
 
 INPUT FORMAT
     Comma-separated values. First row defines column names. Uppercase
@@ -39,7 +65,8 @@ CODING STANDARD
 
   Class System
     Obj(dict):        Base class, provides dot notation access (d.x).
-    CamelCase(args):  Factory functions (Sym, Num, Data) returning Obj.
+    CamelCase(args):  Sym, Num, Data are __slots__ classes (fixed fields,
+                      no per-instance dict); Cols returns an Obj.
     camelcase:        "data" (or e.g. "data1") is created by Data()
 
 ----------------------------------------------------------------------
@@ -51,31 +78,110 @@ API
   Data(s = "", items = []) -- Create dataset from list of rows/items.
   clone(d, rows = [])  -- Create new Data with same structure as d.
   Cols(row)            -- Generate column headers from a list of names.
+  Rows(cols)           -- Columnar row store (one typed array per column).
+  Tally(n = 0)         -- Row counter standing in for Rows (no row data).
 
   # Classifier
-  nb(items)           -- Run incremental Naive Bayes on item iterator.
+  nb(items, score, metrics)
+                      -- Run incremental Naive Bayes on item iterator.
+  stream(items, recent, decay, every, report, metrics)
+                      -- nb() keeping no rows; windowed or decayed stats.
+  train(items, keep)  -- Model (one Data per class); no rows unless keep.
+  predict(model, r)   -- Most likely class for row r.
+  save(model, f)      -- Write model (stats only, no rows) to file f.
+  load(f)             -- Read a model written by save().
+  stats(model)        -- Per class (k, rows, per-column stats) as plain tuples.
+  restore(names, st)  -- Model (rows as Tally) from stats().
+  train_parallel(f, procs) -- train() on shards of f in a process pool.
+
+  # Metrics
+  Confusion(every, to)-- Confusion matrix, updated by add(predicted, actual).
+  m.precision(k), m.recall(k), m.f1(k), m.accuracy(), m.macro()
+                      -- O(1) at any point in the stream.
+  m.snapshot()        -- All of the above as a dict (written every `every`).
+
+  # Tuning
+  sweep(f, grid, procs, cache) -- nb() on f per setting (product of grid);
+                      parse once, process pool, cached; ranked list of dicts.
+  digest(f)           -- sha1 of f's bytes.
+
+  # Batch scoring (needs numpy)
+  freeze(model)       -- Per-class stats as matrices, Sym values as ints.
+  scores(frozen, rows)-- [rows x classes] log-likelihoods for a block.
+  predict_batch(frozen, rows, block) -- Predicted classes, block at a time.
 
   # Methods (Functional)
   add(i, v)           -- Update counts (Sym) or Welford stats (Num).
                       -- If i is Data, add row and update cols.
+  merge(i, j)         -- Fold j's stats (and rows) into i; returns i.
+  sub(i, v, w)        -- Undo add(i, v), now weighing w (Data: over a Tally).
+  fade(i, a)          -- Scale i's counts (and Num m2) by a.
   like(i, v, prior)   -- Calculate likelihood of v given column i.
-  likes(i, r, nall, nh)-- Calculate log-likelihood of row r given Data i.
+  likes(i, r, nall, nh, evidence)-- Log-likelihood of row r given Data i;
+                         evidence = log(nall + m*nh), once per row.
+  loglike(i, v, prior) -- log(like(...)); Num caches versioned by i.n.
+  prior(i, nall, nh, evidence)-- (b4, log b4, same) class prior, cached with
+                         i's Sym log-likelihood tables.
 
   # Utilities
   cast(s)           -- Parse string to int, float, or strip whitespace.
+  discretize(rows, bins, sample)
+                      -- rows with Num x columns as bin numbers (Sym).
+  source(f)           -- csv(f), discretized if -b bins is set.
   csv(file)           -- Iterator yielding rows from CSV file.
+  shards(file, n)     -- n (start, end) byte ranges of file, cut at line ends
+                         outside quoted fields.
+  num(s), sym(s)      -- cast(s) for cells of Num, Sym columns.
   o(t)                -- Pretty print object/dict t.
 """
 
-import re, sys, math
+import io, os, re, sys, json, math, time, locale, hashlib, marshal, tracemalloc
+from array import array
+from bisect import bisect_right
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from csv import reader
+from itertools import chain, islice, product
 from math import sqrt, exp, log
 BIG = 1E32
+TINY = 1E-250 # fold products of like()s into logs before they underflow
+ENCODING = locale.getpreferredencoding(False) # open()'s default; csv() and shards agree
 the={}
 
 # --- functions ------------------------------------------------------
-def csv(f):
-  with open(f) as file:
-    for s in file: yield [cast(x) for x in s.split(",")]
+def csv(f, buffer=1<<20):
+  """Rows from f. The header picks one converter per column (Cols' rules):
+  Num cells skip cast()'s failed int() on floats, Sym cells skip its
+  failed int() and float(), X columns are not converted at all ("?").
+  Quoted fields are honoured."""
+  with open(f, newline="", buffering=buffer, encoding=ENCODING) as file:
+    rows = reader(file)
+    head = [s.strip() for s in next(rows)]; yield head
+    yield from cells(rows, converters(head))
+
+def converters(head):
+  return [skip if s[-1:] == "X" else num if s[:1].isupper() else sym for s in head]
+
+def cells(rows, fns):
+  for r in rows:
+    if r: yield [fn(s) for fn,s in zip(fns, r)]
+
+def num(s):
+  "Same as cast(s), for cells in a Num column."
+  if s.isdecimal(): return int(s)
+  if "." in s:
+    try: return float(s)
+    except ValueError: pass
+  return cast(s)
+
+SPECIAL = {"inf", "infinity", "nan"}
+def sym(s):
+  "Same as cast(s), for cells in a Sym column: only number-like ones try."
+  s = s.strip()
+  if s[:1].isdecimal() or s[:1] in "+-.": return cast(s)
+  return cast(s) if s[:1] in "iInN" and s.lower() in SPECIAL else s
+
+def skip(s): return "?"
 
 def cast(s):
   try: return int(s)
@@ -83,9 +189,32 @@ def cast(s):
     try: return float(s)
     except ValueError: return s.strip()
 
+def discretize(rows, bins, sample=10_000):
+  """Equal-frequency bins for the Num x columns, cut from the first
+  `sample` rows (buffered, then replayed). Those columns are renamed to
+  lowercase, so Cols makes them Sym and like() becomes a table lookup."""
+  rows = iter(rows); head = next(rows)
+  first = list(islice(rows, sample))
+  nums = [at for at,s in enumerate(head) if s[:1].isupper() and s[-1:] not in "!X"]
+  cuts = {}
+  for at in nums:
+    vs = sorted(r[at] for r in first if r[at] != "?")
+    cuts[at] = sorted({vs[len(vs)*j//bins] for j in range(1, bins)}) if vs else []
+  yield [s[0].lower() + s[1:] if at in cuts else s for at,s in enumerate(head)]
+  for r in chain(first, rows):
+    r = list(r)
+    for at, cut in cuts.items():
+      if r[at] != "?": r[at] = bisect_right(cut, r[at])
+    yield r
+
+def source(f):
+  "csv(f), discretized when -b bins is set."
+  return discretize(csv(f), the.bins) if the.bins else csv(f)
+
 def o(t):
   match t:
    case dict(): return "{"+" ".join(f":{k} {o(t[k])}" for k in t)+"}"
+   case Sym()|Num()|Data(): return o({k:getattr(t,k) for k in t.__slots__ if k != "cache"})
    case float(): return f"{int(t)}" if int(t) == t else f"{t:.2f}"
    case list()|tuple(): return str([o(x) for x in t])
    case _: return str(t)
@@ -94,34 +223,129 @@ class Obj(dict):
   __getattr__,__setattr__,__repr__=dict.__getitem__,dict.__setitem__,o
 
 # --- objects ------------------------------------------------------
-def Sym(n=0, s=""): return Obj(at=n, txt=s, n=0, has={})
-def Num(n=0, s=""): return Obj(at=n, txt=s, n=0, mu=0, m2=0)
+class Sym:
+  __slots__ = ("at", "txt", "n", "has", "cache")
+  def __init__(i, n=0, s=""): i.at, i.txt, i.n, i.has, i.cache = n, s, 0, {}, None
+  __repr__ = o
+
+class Num:
+  __slots__ = ("at", "txt", "n", "mu", "m2", "cache")
+  def __init__(i, n=0, s=""): i.at, i.txt, i.n, i.mu, i.m2, i.cache = n, s, 0, 0, 0, None
+  __repr__ = o
+
 def Col(n=0, s=""): return (Num if s[0].isupper() else Sym)(n,s)
 
-def Data(s="", items=[]):
-  d = Obj(txt=s, rows=[], cols=None)
-  [add(d, r) for r in items]
-  return d
+class Data:
+  __slots__ = ("txt", "rows", "cols", "cache")
+  def __init__(i, s="", items=[]):
+    i.txt, i.rows, i.cols, i.cache = s, [], None, None
+    [add(i, r) for r in items]
+  __repr__ = o
 
 def Cols(row):
   all = [Col(n,s) for n,s in enumerate(row)]
-  return Obj(names=row, all=all,
-             x=[c for c in all if not re.search(r"[!X]$", c.txt)],
-             y=[c for c in all if re.search(r"!$", c.txt)])
+  x = [c for c in all if not re.search(r"[!X]$", c.txt)]
+  return Obj(names=row, all=all, x=x,
+             y=[c for c in all if re.search(r"!$", c.txt)],
+             nums=[c for c in x if isinstance(c, Num)],
+             syms=[c for c in x if isinstance(c, Sym)])
+
+MISS = -2**63 # "?" in an array('q') column
+
+class Rows:
+  """Columnar rows: Num columns in array('q') (promoted to 'd' on the
+  first float, to a plain list on an int too big for 64 bits), Sym
+  columns as array('i') codes into a symbol table. "?" is kept in band:
+  MISS in 'q', NaN in 'd', code -1 in 'i'. A real value that looks like
+  one (MISS itself, a NaN) turns its column into a list holding "?".
+  X columns are not stored (they read back as "?").
+  Rows come back out as lists, so len(), [j] and iteration still work."""
+  __slots__ = ("nums", "vals", "syms", "codes", "n")
+  def __init__(i, cols):
+    i.nums = [isinstance(c, Num) for c in cols]
+    i.vals = [None if c.txt[-1:] == "X" else array("q" if num else "i")
+              for c, num in zip(cols, i.nums)]
+    i.syms = [[] for _ in cols]     # code -> symbol
+    i.codes = [{} for _ in cols]    # symbol -> code
+    i.n = 0
+
+  def append(i, r):
+    for j, v in enumerate(r):
+      col = i.vals[j]
+      if col is None: continue
+      if not i.nums[j]:
+        if v == "?": col.append(-1); continue
+        code = i.codes[j].get(v)
+        if code is None: code = i.codes[j][v] = len(i.syms[j]); i.syms[j].append(v)
+        col.append(code)
+        continue
+      if type(col) is array:
+        if v == "?": v = MISS if col.typecode == "q" else math.nan
+        elif isinstance(v, int):
+          if not MISS < v < 2**63: col = i.vals[j] = unpack(col)
+        elif v != v: col = i.vals[j] = unpack(col)
+        elif col.typecode == "q": col = i.vals[j] = array("d", (math.nan if x == MISS else x for x in col))
+      col.append(v)
+    i.n += 1
+
+  def get(i, j, k):
+    col = i.vals[j]
+    if col is None: return "?"
+    v = col[k]
+    if not i.nums[j]: return "?" if v < 0 else i.syms[j][v]
+    if type(col) is list: return v
+    return "?" if (v == MISS if col.typecode == "q" else v != v) else v
+
+  def __len__(i): return i.n
+  def __getitem__(i, k):
+    k = k + i.n if k < 0 else k
+    if not 0 <= k < i.n: raise IndexError(k)
+    return [i.get(j, k) for j in range(len(i.vals))]
+  def __iter__(i): return (i[k] for k in range(i.n))
+  def __repr__(i): return f"<{i.n} rows>"
+
+def unpack(col):
+  "A Num array as a list, its in-band missing values back to \"?\"."
+  q = col.typecode == "q"
+  return ["?" if (x == MISS if q else x != x) else x for x in col]
+
+class Tally:
+  "Just the row count, for Data that never needs its rows back (e.g. a loaded model)."
+  __slots__ = ("n",)
+  def __init__(i, n=0): i.n = n
+  def append(i, _): i.n += 1
+  def __len__(i): return i.n
+  def __repr__(i): return f"<{i.n} rows>"
 
 def add(i, v):
-  if "rows" in i: # Data
-    if not i.cols: i.cols = Cols(v)
+  if isinstance(i, Data):
+    if not i.cols: i.cols = Cols(v); i.rows = Rows(i.cols.all)
     else: i.rows.append([add(c, v[c.at]) for c in i.cols.all])
   elif v != "?":
     i.n += 1
-    if "mu" in i: d = v - i.mu; i.mu += d/i.n; i.m2 += d*(v - i.mu) 
+    if isinstance(i, Num): d = v - i.mu; i.mu += d/i.n; i.m2 += d*(v - i.mu) 
     else: i.has[v] = 1 + i.has.get(v, 0) # Sym
   return v
 
+def merge(i, j):
+  "Fold j's statistics into i (same kind, same columns). Returns i."
+  if isinstance(i, Data):
+    [merge(a, b) for a,b in zip(i.cols.all, j.cols.all)]
+    if isinstance(i.rows, Tally): i.rows.n += len(j.rows)
+    else: [i.rows.append(r) for r in j.rows]
+  elif isinstance(i, Num): # parallel Welford (Chan et al.)
+    n = i.n + j.n
+    if n:
+      d = j.mu - i.mu
+      i.mu += d*j.n/n; i.m2 += j.m2 + d*d*i.n*j.n/n; i.n = n
+  else: # Sym
+    i.n += j.n
+    for v,n in j.has.items(): i.has[v] = n + i.has.get(v, 0)
+  return i
+
 # --- bayes ---------------------------------------------------------
 def like(i, v, prior=0):
-  if "mu" in i: # Num
+  if isinstance(i, Num):
     sd = 0 if i.n < 2 else (i.m2/(i.n - 1))**.5
     var = sd**2 + 1/BIG
     return (1/sqrt(2*math.pi*var)) * exp(-((v - i.mu)**2)/(2*var))
@@ -129,12 +353,60 @@ def like(i, v, prior=0):
     n = i.has.get(v, 0) + the.k*prior
     return max(1/BIG, n/(i.n + the.k + 1/BIG))
 
-def likes(i, r, nall, nh):
-  b4 = (len(i.rows) + the.m)/(nall + the.m*nh)
-  return log(b4) + sum(log(like(c, r[c.at], b4)) 
-                       for c in i.cols.x if r[c.at] != "?")
+def likes(i, r, nall, nh, evidence=None):
+  b4, logb4, same = prior(i, nall, nh, evidence)
+  out, syms = logb4 + sum(loglike(c, r[c.at]) for c in i.cols.nums if r[c.at] != "?"), i.cols.syms
+  if not syms: return out
+  if same: # a trained model: Sym columns (and -b bins) are table lookups
+    tables = i.cache[5]
+    if tables is None: tables = i.cache[5] = [{} for _ in syms]
+    for c, t in zip(syms, tables):
+      v = r[c.at]
+      if v != "?":
+        p = t.get(v)
+        if p is None: p = t[v] = log(like(c, v, b4))
+        out += p
+    return out
+  # nb(): the prior moved, so the tables would go stale every row. Multiply
+  # the like()s instead, and take one log per class, not one per column.
+  k, p = the.k, 1.0
+  for c in syms:
+    v = r[c.at]
+    if v != "?":
+      p *= max(1/BIG, (c.has.get(v, 0) + k*b4)/(c.n + k + 1/BIG))
+      if p < TINY: out += log(p); p = 1.0
+  return out + log(p)
+
+# Caches are versioned by n (Data: row count): add() bumps n, which
+# invalidates them, so nothing has to be cleared by hand (except by sub()).
+def prior(i, nall, nh, evidence=None):
+  """(b4, log b4, unchanged since last call?) for class i. The cache holds
+  log(rows + m), versioned by the row count (.n, not len(): stream()
+  decays it to a float), then the last b4 and, while b4 stays put, one
+  {value: log like()} table per Sym x column (filled by likes()).
+  evidence is log(nall + m*nh): nb() works it out once per row."""
+  m, c = the.m, i.cache
+  if not c or c[0] != i.rows.n or c[1] != m or c[2] != the.k:
+    c = i.cache = [i.rows.n, m, the.k, log(i.rows.n + m) if i.rows.n + m else -math.inf, None, None]
+  if evidence is None: evidence = log(nall + m*nh)
+  b4 = (i.rows.n + m)/(nall + m*nh)
+  if c[4] == b4: return b4, c[3] - evidence, True
+  c[4] = b4; c[5] = None
+  return b4, c[3] - evidence, False
 
-def nb(rows):
+def loglike(i, v, prior=0):
+  "log(like(i, v, prior)); Num's log normaliser and 2var are cached."
+  if isinstance(i, Num):
+    c = i.cache
+    if not c or c[0] != i.n:
+      sd = 0 if i.n < 2 else (i.m2/(i.n - 1))**.5
+      var = sd**2 + 1/BIG
+      c = i.cache = (i.n, -0.5*log(2*math.pi*var), 2*var)
+    return c[1] - (v - i.mu)**2/c[2]
+  return log(like(i, v, prior))
+
+def nb(rows, score=None, metrics=None):
+  score = score or likes
   all, klasses, nh, out = None, {}, 0, Sym()
   for n, row in enumerate(rows):
     if n==0: all = Data("all", [row])
@@ -142,21 +414,501 @@ def nb(rows):
       k = row[all.cols.y[0].at]
       if k not in klasses: nh +=1; klasses[k]=Data(k,[all.cols.names])
       if (n - 1) > the.wait: 
-        fn = lambda cat:likes(klasses[cat],row,n-1,nh)
-        add(out, (max(klasses, key=fn), k)) #(predicted, actual)
+        e = log(n - 1 + the.m*nh)
+        fn = lambda cat:score(klasses[cat],row,n-1,nh,e)
+        p = add(out, (max(klasses, key=fn), k)) #(predicted, actual)
+        if metrics is not None: metrics.add(*p)
       add(klasses[k], row)
   return out
 
+# --- streaming -----------------------------------------------------
+def stream(rows, recent=0, decay=1, every=0, report=None, metrics=None):
+  """nb() where each class is Data over a Tally, so memory is just the
+  column summaries (plus the last `recent` rows, if recent > 0, which
+  are sub()-ed back out as they age). decay < 1 fades every class's
+  stats once per row (so a row leaving the window weighs decay**recent).
+  With the defaults this is nb(), same answers.
+  Calls report(n, accuracy) every `every` predictions."""
+  report = report or (lambda n, acc: print(f"{n:>12,} {acc:.3f}"))
+  all, klasses, out, hits, tried, window = None, {}, Sym(), 0, 0, deque()
+  w = decay**recent
+  for n, row in enumerate(rows):
+    if n==0: all = Data("all", [row]); continue
+    k = row[all.cols.y[0].at]
+    if k not in klasses: klasses[k] = Data(k, [all.cols.names]); klasses[k].rows = Tally()
+    if (n - 1) > the.wait:
+      nall, nh = sum(d.rows.n for d in klasses.values()), len(klasses)
+      e = log(nall + the.m*nh)
+      p = max(klasses, key=lambda c: likes(klasses[c], row, nall, nh, e))
+      add(out, (p, k)); tried += 1; hits += p == k
+      if metrics is not None: metrics.add(p, k)
+      if every and tried % every == 0: report(n, hits/tried)
+    if decay < 1: [fade(d, decay) for d in klasses.values()]
+    add(klasses[k], row)
+    if recent:
+      window.append((k, row))
+      if len(window) > recent: old, r = window.popleft(); sub(klasses[old], r, w)
+  return out
+
+def sub(i, v, w=1):
+  """Take v, added with what is now weight w (after fades), back out of i.
+  Rows still in i weigh at least w, so anything left below w/2 is just
+  rounding: only then is the entry dropped (an absolute cutoff would drop
+  live, heavily faded rows)."""
+  if isinstance(i, Data):
+    [sub(c, v[c.at], w) for c in i.cols.all]; i.rows.n -= w; i.cache = None
+  elif v != "?":
+    i.n -= w; i.cache = None # an add() then sub() would restore n, not the stats
+    if isinstance(i, Num):
+      if i.n < w/2: i.n, i.mu, i.m2 = 0, 0, 0
+      else: d = v - i.mu; i.mu -= w*d/i.n; i.m2 = max(0, i.m2 - w*d*(v - i.mu))
+    else: # Sym
+      i.has[v] -= w
+      if i.has[v] < w/2: del i.has[v]
+  return v
+
+def fade(i, a):
+  if isinstance(i, Data): i.rows.n *= a; [fade(c, a) for c in i.cols.all]
+  elif isinstance(i, Num): i.n *= a; i.m2 *= a
+  else: i.n *= a; i.has = {v: n*a for v,n in i.has.items()}
+  return i
+
+def train(rows, keep=True):
+  "Build one Data per class from rows (first row is the header)."
+  all, klasses = None, {}
+  for n, row in enumerate(rows):
+    if n==0: all = Data("all", [row])
+    else:
+      k = row[all.cols.y[0].at]
+      if k not in klasses:
+        klasses[k] = Data(k,[all.cols.names])
+        if not keep: klasses[k].rows = Tally()
+      add(klasses[k], row)
+  return Obj(cols=all.cols, klasses=klasses, n=sum(len(d.rows) for d in klasses.values()))
+
+def predict(model, r):
+  "Per-row prediction: the class with the highest likes()."
+  nall, nh = model.n, len(model.klasses)
+  e = log(nall + the.m*nh)
+  return max(model.klasses, key=lambda k: likes(model.klasses[k], r, nall, nh, e))
+
+def train_parallel(f, procs=None, shard=64 * 2**20):
+  """train() on f in a process pool: each worker trains on a shard of
+  lines (rows not kept) and sends back statistics, which are merged in
+  file order, so classes come out in first-seen order as in train()."""
+  procs = procs or os.cpu_count()
+  head = next(csv(f))
+  n = max(procs, os.path.getsize(f) // shard)
+  with ProcessPoolExecutor(procs) as pool:
+    parts = pool.map(train_shard, *zip(*[(f, head, a, b) for a,b in shards(f, n)]))
+    model = None
+    for part in parts:
+      part = restore(head, part)
+      if not model: model = part; continue
+      for k, d in part.klasses.items():
+        if k in model.klasses: merge(model.klasses[k], d)
+        else: model.klasses[k] = d
+      model.n += part.n
+  return model or restore(head, [])
+
+def train_shard(f, head, start, end):
+  "train() on bytes [start, end) of f, read as csv() reads it."
+  with open(f, "rb") as file:
+    file.seek(start)
+    text = io.TextIOWrapper(io.BytesIO(file.read(end - start)), encoding=ENCODING, newline="")
+    model = train([head, *cells(reader(text), converters(head))], keep=False)
+  return stats(model)
+
+def shards(f, n):
+  """n (start, end) byte ranges of f after the header, cut at line ends.
+  A cut that lands inside a quoted field (an odd number of '"' since the
+  header) moves on a line at a time until the quote closes."""
+  size = os.path.getsize(f)
+  with open(f, "rb") as file:
+    file.readline(); cuts, odd = [file.tell()], False
+    for j in range(1, n):
+      file.seek(max(cuts[-1], cuts[0] + (size - cuts[0])*j//n))
+      if file.tell() > cuts[0]: file.readline()
+      odd ^= quotes(file, cuts[-1], file.tell()) % 2 == 1
+      while odd and (line := file.readline()): odd ^= line.count(b'"') % 2 == 1
+      cuts.append(file.tell())
+  cuts.append(size)
+  return [(a, b) for a,b in zip(cuts, cuts[1:]) if a < b]
+
+def quotes(file, start, end, chunk=1<<20):
+  "Count of '\"' bytes in [start, end) of file; leaves file at end."
+  file.seek(start); n = 0
+  while start < end and (s := file.read(min(chunk, end - start))):
+    n += s.count(b'"'); start += len(s)
+  return n
+
+# --- metrics -------------------------------------------------------
+class Confusion:
+  """Confusion matrix over classes in first-seen order: m[actual][predicted]
+  in array('q') rows, plus row/column sums and per-class precision,
+  recall, F1 (and their sums, for the macro averages). add() touches at
+  most two classes, so every metric is O(1) at any point in the stream.
+  Every `every` predictions, snapshot() is appended to `to`.jsonl/.csv."""
+  __slots__ = ("klasses", "at", "m", "actual", "predicted", "n", "hits",
+               "p", "r", "f", "sums", "every", "to")
+  def __init__(i, every=0, to="nb_metrics"):
+    i.klasses, i.at, i.m, i.n, i.hits = [], {}, [], 0, 0
+    i.actual, i.predicted = array("q"), array("q")
+    i.p, i.r, i.f, i.sums = array("d"), array("d"), array("d"), [0, 0, 0]
+    i.every, i.to = every, to
+  __repr__ = o
+
+  def index(i, k):
+    j = i.at.get(k)
+    if j is None:
+      j = i.at[k] = len(i.klasses); i.klasses.append(k)
+      for row in i.m: row.append(0)
+      i.m.append(array("q", bytes(8*(j + 1))))
+      for a in (i.actual, i.predicted, i.p, i.r, i.f): a.append(0)
+    return j
+
+  def add(i, predicted, actual):
+    a, b = i.index(actual), i.index(predicted)
+    i.m[a][b] += 1; i.actual[a] += 1; i.predicted[b] += 1
+    i.n += 1; i.hits += a == b
+    for j in {a, b}: i.rescore(j)
+    if i.every and i.n % i.every == 0: i.write()
+    return i
+
+  def rescore(i, j):
+    tp = i.m[j][j]
+    p = tp/i.predicted[j] if i.predicted[j] else 0
+    r = tp/i.actual[j] if i.actual[j] else 0
+    f = 2*p*r/(p + r) if p + r else 0
+    for s, (a, new) in enumerate([(i.p, p), (i.r, r), (i.f, f)]):
+      i.sums[s] += new - a[j]; a[j] = new
+
+  def precision(i, k): return i.p[i.at[k]]
+  def recall(i, k):    return i.r[i.at[k]]
+  def f1(i, k):        return i.f[i.at[k]]
+  def accuracy(i):     return i.hits/i.n if i.n else 0
+  def micro(i):
+    "Single-label: micro precision = recall = F1 = accuracy."
+    return dict(precision=i.accuracy(), recall=i.accuracy(), f1=i.accuracy())
+  def macro(i):
+    K = len(i.klasses) or 1
+    return dict(precision=i.sums[0]/K, recall=i.sums[1]/K, f1=i.sums[2]/K)
+
+  def snapshot(i):
+    return dict(n=i.n, accuracy=i.accuracy(), macro=i.macro(), micro=i.micro(),
+                klasses={k: dict(support=i.actual[j], predicted=i.predicted[j], tp=i.m[j][j],
+                                 precision=i.p[j], recall=i.r[j], f1=i.f[j])
+                         for j, k in enumerate(i.klasses)},
+                matrix=[list(row) for row in i.m])
+
+  def write(i):
+    "Append a snapshot: one JSON line; CSV rows per class, then macro and micro."
+    snap = i.snapshot()
+    with open(i.to + ".jsonl", "a") as file: file.write(json.dumps(snap) + "\n")
+    new = not os.path.exists(i.to + ".csv")
+    with open(i.to + ".csv", "a") as file:
+      if new: file.write("n,class,support,precision,recall,f1\n")
+      for k, t in snap["klasses"].items():
+        file.write(f"{i.n},{k},{t['support']},{t['precision']:.6f},{t['recall']:.6f},{t['f1']:.6f}\n")
+      for k in ("macro", "micro"):
+        t = snap[k]
+        file.write(f"{i.n},{k},{i.n},{t['precision']:.6f},{t['recall']:.6f},{t['f1']:.6f}\n")
+
+# --- sweep ---------------------------------------------------------
+ROWS = None # what score() runs nb() on: set by share(), once per process
+
+def sweep(f, grid, procs=1, cache="nb_sweep.json"):
+  """nb() on f for every setting in the product of grid (option -> values).
+  f is parsed once (and -b binned); settings not already in `cache` (keyed
+  by digest(f), bins and the setting) run on a process pool that gets the
+  rows once per worker. Returns settings + scores, best accuracy first."""
+  done = {}
+  if os.path.exists(cache):
+    with open(cache) as file: done = json.load(file)
+  data = f"{digest(f)} bins:{the.bins}"
+  key = lambda t: f"{data} {json.dumps(t, sort_keys=True)}"
+  settings = [dict(zip(grid, vs)) for vs in product(*grid.values())]
+  todo = [t for t in settings if key(t) not in done]
+  if todo:
+    rows = list(source(f))
+    if procs > 1:
+      with ProcessPoolExecutor(procs, initializer=share, initargs=(rows,)) as pool:
+        scored = list(pool.map(score, todo))
+    else: share(rows); scored = [score(t) for t in todo]
+    done.update((key(t), s) for t, s in zip(todo, scored))
+    with open(cache, "w") as file: json.dump(done, file)
+  return sorted((dict(t, **done[key(t)]) for t in settings),
+                key=lambda t: (-t["accuracy"], -t["f1"]))
+
+def share(rows):
+  global ROWS; ROWS = rows
+
+def score(setting):
+  "Accuracy and macro F1 of nb(ROWS) under setting; `the` is restored after."
+  old = {k: the[k] for k in setting}
+  the.update(setting)
+  try: m = Confusion(); nb(ROWS, metrics=m)
+  finally: the.update(old)
+  return dict(accuracy=m.accuracy(), f1=m.macro()["f1"], n=m.n)
+
+def digest(f):
+  h = hashlib.sha1()
+  with open(f, "rb") as file:
+    while chunk := file.read(1 << 20): h.update(chunk)
+  return h.hexdigest()
+
+# --- save / load ----------------------------------------------------
+MAGIC = b"NB1\n"
+
+def stats(model):
+  """Sufficient statistics as plain tuples: per class the row count,
+  (n, mu, m2) per Num and (n, has) per Sym."""
+  one = lambda c: (c.n, c.mu, c.m2) if isinstance(c, Num) else (c.n, c.has)
+  return [(k, len(d.rows), [one(c) for c in d.cols.all]) for k, d in model.klasses.items()]
+
+def save(model, f):
+  "Binary model file: MAGIC + marshal of (names, stats(model))."
+  with open(f, "wb") as file:
+    file.write(MAGIC + marshal.dumps((list(model.cols.names), stats(model)), 4))
+
+def load(f):
+  with open(f, "rb") as file: blob = file.read()
+  if not blob.startswith(MAGIC): sys.exit(f"{f}: not an nb model")
+  return restore(*marshal.loads(blob[len(MAGIC):]))
+
+def restore(names, klasses):
+  "A model (rows as Tally) from stats()'s tuples."
+  model = Obj(cols=Cols(names), klasses={}, n=0)
+  for k, nrows, stats in klasses:
+    d = model.klasses[k] = Data(k)
+    d.cols, d.rows = Cols(names), Tally(nrows)
+    for c, st in zip(d.cols.all, stats):
+      if isinstance(c, Num): c.n, c.mu, c.m2 = st
+      else: c.n, c.has = st
+    model.n += nrows
+  return model
+
+def predictions(model, rows):
+  "Predicted classes for rows: numpy blocks when numpy is installed, else row by row."
+  try: import numpy as _
+  except ImportError: return (predict(model, r) for r in rows)
+  return predict_batch(freeze(model), rows)
+
+# --- batch (numpy) -------------------------------------------------
+def freeze(model):
+  """Per-class sufficient statistics as matrices (K classes):
+  Num: mu, var [K, nums]; Sym: log-probability tables [K, syms, V+1]
+  where code V stands for a value no class has seen."""
+  np = numpy()
+  ks, nall, nh = list(model.klasses), model.n, len(model.klasses)
+  datas = [model.klasses[k] for k in ks]
+  nums = [c.at for c in model.cols.x if isinstance(c, Num)]
+  syms = [c.at for c in model.cols.x if isinstance(c, Sym)]
+  b4 = np.array([(len(d.rows) + the.m)/(nall + the.m*nh) for d in datas])
+  col = lambda d, at: d.cols.all[at]
+  mu, var = np.zeros((len(ks), len(nums))), np.zeros((len(ks), len(nums)))
+  for a, d in enumerate(datas):
+    for b, at in enumerate(nums):
+      c = col(d, at)
+      sd = 0 if c.n < 2 else (c.m2/(c.n - 1))**.5
+      mu[a, b], var[a, b] = c.mu, sd**2 + 1/BIG
+  codes = [{} for _ in syms]      # value -> int, per Sym column
+  for d in datas:
+    for b, at in enumerate(syms):
+      for v in col(d, at).has: codes[b].setdefault(v, len(codes[b]))
+  V = max((len(t) for t in codes), default=0)
+  logp = np.zeros((len(ks), len(syms), V + 1))
+  for a, d in enumerate(datas):
+    for b, at in enumerate(syms):
+      c = col(d, at)
+      n = np.full(V + 1, the.k*b4[a])
+      for v, code in codes[b].items(): n[code] += c.has.get(v, 0)
+      logp[a, b] = np.log(np.maximum(1/BIG, n/(c.n + the.k + 1/BIG)))
+  return Obj(klasses=ks, nums=nums, syms=syms, codes=codes, V=V, logb4=np.log(b4),
+             mu=mu, var=var, lognorm=-0.5*np.log(2*math.pi*var), logp=logp)
+
+def scores(frozen, rows):
+  "Log-likelihood of every row in a block against every class: [R, K]."
+  np, z = numpy(), frozen
+  X = np.array([[math.nan if r[at] == "?" else r[at] for at in z.nums] for r in rows],
+               dtype=float).reshape(len(rows), len(z.nums))
+  S = np.array([[-1 if r[at] == "?" else z.codes[b].get(r[at], z.V) for b, at in enumerate(z.syms)]
+                for r in rows], dtype=np.int64).reshape(len(rows), len(z.syms))
+  ll = z.lognorm[None] - (X[:, None, :] - z.mu[None])**2 / (2*z.var[None])   # [R, K, nums]
+  out = z.logb4[None] + np.where(np.isnan(ll), 0, ll).sum(axis=2)
+  if z.syms:
+    K, cols = np.arange(len(z.klasses))[None, :, None], np.arange(len(z.syms))[None, None, :]
+    lp = z.logp[K, cols, np.maximum(S, 0)[:, None, :]]                        # [R, K, syms]
+    out += np.where(S[:, None, :] < 0, 0, lp).sum(axis=2)
+  return out
+
+def predict_batch(frozen, rows, block=10_000):
+  "Yield predicted classes, scoring `block` rows at a time."
+  rows, np = iter(rows), numpy()
+  while chunk := list(islice(rows, block)):
+    for j in np.argmax(scores(frozen, chunk), axis=1): yield frozen.klasses[j]
+
+def numpy():
+  try: import numpy
+  except ImportError: sys.exit("batch mode needs numpy (pip install numpy)")
+  return numpy
+
 # --- main ----------------------------------------------------------
 def eg_h(_):    print(__doc__)
 def eg__the(_): print(o(the))
 def eg__sym(_): print(add(add(add(Sym(),"a"),"a"),"b"))
 def eg__num(_): print([add(Num(), x) for x in [10,20,30,40]][-1])
 def eg__csv(f): [print(r) for r in csv(f)]
-def eg__nb(f):  [print(n,*x) for x,n in nb(csv(f)).has.items()] 
+def eg__nb(f):  [print(n,*x) for x,n in nb(source(f)).has.items()] 
+
+def eg__batch(f):
+  "Train on F, then score F row by row and in numpy blocks; compare."
+  rows = list(csv(f))
+  model = train(rows)
+  numpy() # pay for the first import before the clock starts
+  t = time.perf_counter(); one = [predict(model, r) for r in rows[1:]]; t1 = time.perf_counter() - t
+  t = time.perf_counter(); frozen = freeze(model); many = list(predict_batch(frozen, rows[1:])); t2 = time.perf_counter() - t
+  y = model.cols.y[0].at
+  same = sum(a == b for a, b in zip(one, many))
+  acc = sum(p == r[y] for p, r in zip(many, rows[1:]))
+  print(f"rows: {len(one)}  agree: {same/len(one):.4f}  accuracy: {acc/len(one):.4f}")
+  print(f"per-row: {len(one)/t1:,.0f} rows/sec  batch: {len(one)/t2:,.0f} rows/sec")
+
+def eg__train(f):
+  t = time.perf_counter()
+  model = train_parallel(f, the.procs) if the.procs > 1 else train(csv(f))
+  save(model, the.model)
+  print(f"trained on {model.n} rows, {len(model.klasses)} classes -> {the.model} in {time.perf_counter()-t:.3f}s")
+
+def eg__predict(f):
+  t0 = time.perf_counter()
+  model = load(the.model)
+  cold = time.perf_counter() - t0
+  rows = csv(f); names = next(rows)
+  if names != model.cols.names: sys.exit(f"{f}: header does not match {the.model}")
+  rows, y, out = list(rows), model.cols.y[0].at, Sym()
+  t1 = time.perf_counter()
+  for p, r in zip(predictions(model, rows), rows): add(out, (p, r[y])) #(predicted, actual)
+  t = time.perf_counter() - t1
+  [print(n,*x) for x,n in out.has.items()]
+  print(f"cold start: {cold*1000:.1f} ms  scoring: {len(rows)/t:,.0f} rows/sec")
+
+def eg__cache(f):
+  "nb and predict with cached log-space stats vs recomputing like() every time."
+  def likes0(i, r, nall, nh, evidence=None):
+    b4 = (len(i.rows) + the.m)/(nall + the.m*nh)
+    return log(b4) + sum(log(like(c, r[c.at], b4)) for c in i.cols.x if r[c.at] != "?")
+  rows = list(csv(f))
+  t = time.perf_counter(); a = nb(rows, likes0); t0 = time.perf_counter() - t
+  t = time.perf_counter(); b = nb(rows); t1 = time.perf_counter() - t
+  print(f"nb       uncached {len(rows)/t0:9,.0f} rows/sec  cached {len(rows)/t1:9,.0f}  same: {a.has == b.has}")
+  model = train(rows)
+  nall, nh = model.n, len(model.klasses)
+  pick = lambda fn, r: max(model.klasses, key=lambda k: fn(model.klasses[k], r, nall, nh))
+  t = time.perf_counter(); a = [pick(likes0, r) for r in rows[1:]]; t0 = time.perf_counter() - t
+  t = time.perf_counter(); b = [pick(likes, r) for r in rows[1:]]; t1 = time.perf_counter() - t
+  print(f"predict  uncached {len(rows)/t0:9,.0f} rows/sec  cached {len(rows)/t1:9,.0f}  same: {a == b}")
+
+def eg__ingest(f):
+  "Parse F with csv() and with the old split-and-cast() loop."
+  def csv0(f):
+    with open(f) as file:
+      for s in file: yield [cast(x) for x in s.split(",")]
+  for txt, fn in [("split+cast", csv0), ("csv", csv)]:
+    t = time.perf_counter(); n = sum(1 for _ in fn(f)); t = time.perf_counter() - t
+    print(f"{txt:10} {n/t:11,.0f} rows/sec")
+  keep = [fn is not skip for fn in converters(next(csv(f)))] # csv() reads X cells as "?"
+  cut = lambda r: [x for x, k in zip(r, keep) if k]
+  print("same:", all(cut(a) == cut(b) for a,b in zip(csv0(f), csv(f))))
+
+def eg__ptrain(f):
+  "Sequential vs process-pool training on F."
+  t = time.perf_counter(); a = train(csv(f), keep=False); t0 = time.perf_counter() - t
+  t = time.perf_counter(); b = train_parallel(f, the.procs); t1 = time.perf_counter() - t
+  same = list(a.klasses) == list(b.klasses) and all(
+           len(a.klasses[k].rows) == len(b.klasses[k].rows) and all(
+             x.n == y.n and (x.has == y.has if isinstance(x, Sym) else
+                             math.isclose(x.mu, y.mu) and math.isclose(x.m2, y.m2, abs_tol=1E-9))
+             for x,y in zip(a.klasses[k].cols.all, b.klasses[k].cols.all))
+           for k in a.klasses)
+  rows = list(csv(f))[1:]
+  print(f"train {t0:.2f}s  train_parallel(procs={the.procs}) {t1:.2f}s  "
+        f"x{t0/t1:.2f}  same stats: {same}  same predictions: "
+        f"{all(predict(a, r) == predict(b, r) for r in rows)}")
+
+def eg__stream(f):
+  "Streaming nb on F, running accuracy every -e rows, then peak memory."
+  tracemalloc.start()
+  out = stream(source(f), the.recent, the.decay, the.every)
+  peak = tracemalloc.get_traced_memory()[1]; tracemalloc.stop()
+  [print(n,*x) for x,n in out.has.items()]
+  print(f"peak: {peak/2**20:.2f} MiB")
+
+def eg__metrics(f):
+  "nb on F with a Confusion; check it against counts from the out Sym."
+  m = Confusion(the.snap, the.snapto)
+  out = nb(source(f), metrics=m)
+  print(f"{'class':>24} {'n':>6} {'prec':>6} {'rec':>6} {'f1':>6}")
+  for k in m.klasses:
+    print(f"{str(k)[:24]:>24} {m.actual[m.at[k]]:>6} {m.precision(k):6.3f} {m.recall(k):6.3f} {m.f1(k):6.3f}")
+  for txt, t in [("macro", m.macro()), ("micro", m.micro())]:
+    print(f"{txt:>24} {m.n:>6} {t['precision']:6.3f} {t['recall']:6.3f} {t['f1']:6.3f}")
+  tp = lambda k: out.has.get((k, k), 0)
+  same = all(m.m[m.at[a]][m.at[p]] == n for (p, a), n in out.has.items()) and all(
+    math.isclose(m.f1(k), 2*tp(k)/(m.actual[m.at[k]] + m.predicted[m.at[k]])) for k in m.klasses)
+  print("matches out:", same)
+
+def eg__bins(f):
+  """Gaussian vs -b bins (default 5, 10) Num columns on F: nb() rows/sec,
+  accuracy and macro F1, then predict() rows/sec from a trained model."""
+  rows = list(csv(f))
+  for bins in [0] + ([the.bins] if the.bins else [5, 10]):
+    data = list(discretize(rows, bins)) if bins else rows
+    t = time.perf_counter()
+    m = Confusion(); nb(data, metrics=m)
+    t1 = time.perf_counter() - t
+    model = train(data)
+    t = time.perf_counter(); [predict(model, r) for r in data[1:]]; t2 = time.perf_counter() - t
+    print(f"{'gaussian' if not bins else f'bins={bins}':>10}  nb {len(rows)/t1:9,.0f} rows/sec  "
+          f"accuracy {m.accuracy():.3f}  macro f1 {m.macro()['f1']:.3f}  "
+          f"predict {len(rows)/t2:9,.0f} rows/sec")
+
+def eg__sweep(f):
+  vals = lambda x: [cast(v) for v in str(x).split(",")]
+  grid = dict(k=vals(the.ks), m=vals(the.ms), wait=vals(the.waits))
+  t = time.perf_counter()
+  out = sweep(f, grid, the.procs, the.cache)
+  print(f"{'k':>4} {'m':>4} {'wait':>5} {'acc':>6} {'f1':>6}")
+  for r in out: print(f"{r['k']:>4} {r['m']:>4} {r['wait']:>5} {r['accuracy']:6.3f} {r['f1']:6.3f}")
+  print(f"{len(out)} settings in {time.perf_counter() - t:.2f}s")
+
+def eg__window(f):
+  "--stream on F with -r windows and -d decays, alone and combined."
+  for recent, decay in [(0, 1), (20, 1), (0, 0.9), (20, 0.9), (20, 0.1), (200, 0.5)]:
+    m = Confusion()
+    stream(csv(f), recent, decay, metrics=m)
+    print(f"recent {recent:>4}  decay {decay:<4}  accuracy {m.accuracy():.3f}")
+
+def eg__compact(f):
+  "Memory of rows as lists vs Rows, and nb throughput."
+  rows = list(csv(f))
+  tracemalloc.start()
+  lists = [list(r) for r in rows[1:]]
+  mb_lists = tracemalloc.get_traced_memory()[0] / 2**20
+  del lists
+  tracemalloc.reset_peak()
+  base = tracemalloc.get_traced_memory()[0]
+  data = Data(f, rows)
+  mb_data = (tracemalloc.get_traced_memory()[0] - base) / 2**20
+  tracemalloc.stop()
+  print(f"rows: {len(data.rows)}  as lists: {mb_lists:.1f} MiB  Data (columnar): {mb_data:.1f} MiB")
+  t = time.perf_counter(); nb(rows); t = time.perf_counter() - t
+  print(f"nb: {len(rows)/t:,.0f} rows/sec")
 
 the=Obj(**{k:cast(v) for k,v in re.findall(r"(\S+)=(\S+)",__doc__)})
+flags={f:k for f,k in re.findall(r"\n\s+(-\w)\s+(\S+)=",__doc__)}
 if __name__ == "__main__":
   for j,s in enumerate(sys.argv):
-    if f := vars().get(f"eg{s.replace('-', '_')}"):
-      f(sys.argv[j+1] if j+1 < len(sys.argv) else None)
+    arg = sys.argv[j+1] if j+1 < len(sys.argv) else None
+    if k := flags.get(s): the[k] = cast(arg)
+    elif f := vars().get(f"eg{s.replace('-', '_')}"): f(arg)
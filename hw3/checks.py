@@ -1,9 +1,19 @@
 #!/usr/bin/env python3
+import ast
 import csv
+import hashlib
+import os
+import re
 import sys
 from math import sqrt
 
 MISSING = "?"
+CLASS = "class!"
+THRESHOLD = 0.95    # |r| above which check B calls two features correlated
+BLOCK = 100_000     # rows per block when building correlation sums
+RULES = os.path.join(os.path.dirname(os.path.abspath(__file__)), "checks.rules")
+H_KEY = ["HEIGHT", "LENGHT", "WIDTH", "AREA", "ECCEN", "P_BLACK", "P_AND",
+         "MEAN_TR", "BLACKPIX", "BLACKAND", "WB_TRANS", "DATASET_ID"]
 
 def mean(xs):
     return sum(xs) / len(xs) if xs else 0
@@ -25,412 +35,588 @@ def pearson(xs, ys):
         return 0
     return num / sqrt(dx * dy)
 
-def load_rows(path):
-    with open(path) as f:
-        return list(csv.DictReader(f))
-
-def numeric_columns(rows):
-    cols = rows[0].keys()
-    return [c for c in cols if c != "class!"]
-
-def to_float_column(rows, col):
-    xs = []
-    for r in rows:
-        if r[col] != MISSING:
-            xs.append(float(r[col]))
-    return xs
+# ----------------------------------------------------------------------
+# Shared, parse-once representation
+# ----------------------------------------------------------------------
 
-def print_feature_results(features):
-    print(len(features))
+class Table:
+    """The CSV parsed once into columns. `raw` holds each column's strings
+    (A and H compare those); `nums` holds every non-class column as floats,
+    None where missing. Statistics shared by several checks (C/G, I and the
+    row invariants D/E/J/K) are computed on first use and then reused."""
+
+    def __init__(self, path, rules=RULES):
+        with open(path, newline="") as f:
+            reader = csv.reader(f)
+            self.header = next(reader)
+            rows = [r for r in reader if r]
+        self.n = len(rows)
+        self.raw = {h: col for h, col in zip(self.header, zip(*rows))}
+        self.nums = {h: [None if v == MISSING else float(v) for v in self.raw[h]]
+                     for h in numeric_columns(self.header)}
+        self.complete = [MISSING not in r for r in rows]
+        self.rules_path = rules
+        self._stats = self._class_stats = self._rules = None
+
+    def column(self, col):
+        "Non-missing values of a numeric column, in row order."
+        return [v for v in self.nums[col] if v is not None]
+
+    def stats(self):
+        "{col: (mean, sd)} over each numeric column's non-missing values."
+        if self._stats is None:
+            self._stats = {}
+            for col in self.nums:
+                vals = self.column(col)
+                self._stats[col] = (mean(vals), sd(vals))
+        return self._stats
+
+    def class_stats(self):
+        "{col: {class: (mean, sd)}}, (0, 0) for a class with no values."
+        if self._class_stats is None:
+            classes = set(self.raw[CLASS])
+            self._class_stats = {}
+            for col in self.nums:
+                groups = {cls: [] for cls in classes}
+                for cls, v in zip(self.raw[CLASS], self.nums[col]):
+                    if v is not None:
+                        groups[cls].append(v)
+                self._class_stats[col] = {cls: (mean(vs), sd(vs)) if vs else (0, 0)
+                                          for cls, vs in groups.items()}
+        return self._class_stats
+
+    def rules(self):
+        "{set: (features, lines)} for every rule set, from one pass: see run_rules()."
+        if self._rules is None:
+            self._rules = run_rules(self, self.rules_path)
+        return self._rules
+
+def load_table(path, rules=RULES):
+    return Table(path, rules)
+
+def numeric_columns(header):
+    return [c for c in header if c != CLASS]
+
+def print_feature_results(features, out=sys.stdout):
+    print(len(features), file=out)
     for f in sorted(features):
-        print(f)
+        print(f, file=out)
 
-def print_case_results(rows):
-    print(len(rows))
+def print_case_results(rows, out=sys.stdout):
+    print(len(rows), file=out)
     for r in sorted(rows):
-        print(r)
+        print(r, file=out)
 
 # ----------------------------------------------------------------------
 # A – Identical features
 # ----------------------------------------------------------------------
 
-def check_A(path):
-    rows = load_rows(path)
-    header = list(rows[0].keys())
-
-    # build column vectors (including missing)
-    cols = {h: [] for h in header}
-
-    for r in rows:
-        for h in header:
-            cols[h].append(r[h])
-    
+def find_A(t):
     identical = set()
-
-    for h in header:
-        first = cols[h][0]
-        SAME = True
-        for rowIndex in range(1, len(cols[h])):
-            if cols[h][rowIndex] != first:
-                SAME = False
-                break
-        if SAME:
+    for h, col in t.raw.items():
+        first = col[0]
+        if all(v == first for v in col):
             identical.add(h)
-
-    print_feature_results(identical)
+    return identical
 
 # ----------------------------------------------------------------------
 # B – Correlated features
 # ----------------------------------------------------------------------
 
-def check_B(path):
-    rows = load_rows(path)
-    cols = numeric_columns(rows)
+def find_B(t, threshold=THRESHOLD):
+    cols = list(t.nums)
+    r = correlations(t)
 
     correlated = set()
 
     for i in range(len(cols)):
         for j in range(i+1, len(cols)):
-            xi = to_float_column(rows, cols[i])
-            xj = to_float_column(rows, cols[j])
-
-            if len(xi) != len(xj) or len(xi) == 0:
-                continue
-
-            r = pearson(xi, xj)
-            if abs(r) > 0.95:
+            if abs(r[i][j]) > threshold:
                 correlated.add(cols[i])
                 correlated.add(cols[j])
 
-    print_feature_results(correlated)
+    return correlated
+
+def correlations(t):
+    """Pairwise-complete Pearson r between every two numeric columns: each
+    pair uses the rows where both are present. With numpy, sums are built
+    a block of rows at a time as matrix products over a missing-value mask;
+    without it, pearson() runs pair by pair."""
+    try:
+        import numpy as np
+    except ImportError:
+        return correlations_py(t)
+
+    cols = list(t.nums)
+    p = len(cols)
+    # centre on each column's mean, so the sums below do not cancel
+    stats = t.stats()
+    mu = np.array([stats[c][0] for c in cols])
+    n, sx, sxx, sxy = (np.zeros((p, p)) for _ in range(4))
+    for lo in range(0, t.n, BLOCK):
+        X = np.array([t.nums[c][lo:lo + BLOCK] for c in cols], dtype=float).T - mu
+        M = (~np.isnan(X)).astype(float)
+        X = np.where(M > 0, X, 0)
+        n += M.T @ M                # [i,j]: rows with both i and j
+        sx += X.T @ M               # [i,j]: sum of i over those rows
+        sxx += (X * X).T @ M
+        sxy += X.T @ X
+    with np.errstate(divide="ignore", invalid="ignore"):
+        cov = sxy - sx * sx.T / n
+        vx = sxx - sx ** 2 / n
+        r = cov / np.sqrt(vx * vx.T)
+    return np.where((n > 0) & (vx > 0) & (vx.T > 0), r, 0).tolist()
+
+def correlations_py(t):
+    cols = list(t.nums)
+    r = [[0] * len(cols) for _ in cols]
+    for i in range(len(cols)):
+        for j in range(i+1, len(cols)):
+            pairs = [(x, y) for x, y in zip(t.nums[cols[i]], t.nums[cols[j]])
+                     if x is not None and y is not None]
+            r[i][j] = r[j][i] = pearson([x for x, _ in pairs], [y for _, y in pairs])
+    return r
 
 # ----------------------------------------------------------------------
 # C – Outlier features
 # ----------------------------------------------------------------------
 
-def check_C(path):
-    rows = load_rows(path)
-    cols = numeric_columns(rows)
-
+def find_C(t):
     outlier_cols = set()
 
-    for col in cols:
-        vals = to_float_column(rows, col)
-        if not vals:
-            continue
-
-        mu = mean(vals)
-        sigma = sd(vals)
-
+    for col, (mu, sigma) in t.stats().items():
         if sigma == 0:
             continue
+        if any(abs(v - mu) > 3 * sigma for v in t.column(col)):
+            outlier_cols.add(col)
 
-        for v in vals:
-            if abs(v - mu) > 3 * sigma:
-                outlier_cols.add(col)
-                break
-
-    print_feature_results(outlier_cols)
+    return outlier_cols
 
 # ----------------------------------------------------------------------
-# D – Features with conflicting values
+# D, E, J, K – Row invariants, from a rules file (see checks.rules)
 # ----------------------------------------------------------------------
 
-def check_D(path):
-    rows = load_rows(path)
-    bad_features = set()
+NAME = re.compile(r"(?<!\w)[A-Za-z_][\w!]*")
+BUILTINS = {"abs", "min", "max", "and", "or", "not"}
+SAFE = (ast.Expression, ast.BoolOp, ast.And, ast.Or, ast.UnaryOp, ast.Not,
+        ast.USub, ast.UAdd, ast.BinOp, ast.Add, ast.Sub, ast.Mult, ast.Div,
+        ast.FloorDiv, ast.Mod, ast.Pow, ast.Compare, ast.Eq, ast.NotEq,
+        ast.Lt, ast.LtE, ast.Gt, ast.GtE, ast.Name, ast.Load, ast.Call,
+        ast.Constant)
+SCOPES = {"complete", "present", "flag-missing"}
+
+def parse_rules(path):
+    """Read a rules file into ({set: scope}, [(sets, condition, tolerance,
+    guard)]); sets keep the order in which they are first named."""
+    scopes, rules = {}, []
+    with open(path) as f:
+        for n, line in enumerate(f, 1):
+            line = line.split("#", 1)[0].strip()
+            if not line:
+                continue
+            kind, _, rest = line.partition(" ")
+            names, _, body = rest.partition(":")
+            names, body = [x.strip() for x in names.split(",")], body.strip()
+            if kind == "rows" and len(names) == 1 and body in SCOPES:
+                scopes[names[0]] = body
+            elif kind == "rule" and body:
+                body, _, guard = body.partition(" if ")
+                cond, _, tol = body.partition("+-")
+                if tol and "==" not in cond:
+                    sys.exit(f"{path}:{n}: a tolerance needs 'L == R'")
+                rules.append((names, cond.strip(), tol.strip(), guard.strip()))
+                for x in names:
+                    scopes.setdefault(x, "complete")
+            else:
+                sys.exit(f"{path}:{n}: cannot parse: {line}")
+    return scopes, rules
+
+def compile_rules(path, header):
+    """Generate, and exec once, one Python function for the whole rules file:
+    fn(complete, *values of columns) -> one bitmask per set (bit i: that
+    set's rule i broke; -1: a flag-missing set saw a missing value).
+    Returns (fn, columns, sets, features) where features[set][i] are the
+    columns named by the set's rule i."""
+    scopes, rules = parse_rules(path)
+    variables = {}
+
+    def code(s, used):
+        def name(m):
+            w = m.group()
+            for col in (w, w.rstrip("!")):
+                if col in header:
+                    used.append(col)
+                    var = variables.setdefault(col, f"x{len(variables)}")
+                    return var + w[len(col):]
+            if w in BUILTINS:
+                return w
+            sys.exit(f"{path}: unknown column {w!r} in: {s}")
+        out = NAME.sub(name, s)
+        try:
+            nodes = list(ast.walk(ast.parse(out.strip(), mode="eval")))
+        except SyntaxError:
+            sys.exit(f"{path}: cannot parse: {s}")
+        for x in nodes:    # columns, numbers, operators and abs/min/max only
+            if (not isinstance(x, SAFE)
+                    or isinstance(x, ast.Constant) and type(x.value) not in (int, float)
+                    or isinstance(x, ast.Call) and (x.keywords or not isinstance(x.func, ast.Name)
+                                                    or x.func.id not in BUILTINS)):
+                sys.exit(f"{path}: not allowed in a rule: {s}")
+        return out
+
+    compiled = []    # (sets, broken-if expression, columns)
+    for sets, cond, tol, guard in rules:
+        used = []
+        if tol:
+            try:
+                tol = float(tol)
+            except ValueError:
+                sys.exit(f"{path}: tolerance is not a number: {tol}")
+            lhs, rhs = cond.split("==", 1)
+            test = f"abs(({code(lhs, used)}) - ({code(rhs, used)})) > {tol!r}"
+        else:
+            test = f"not ({code(cond, used)})"
+        if guard:
+            test = f"({code(guard, used)}) and {test}"
+        compiled.append((sets, test, list(dict.fromkeys(used))))
+
+    src, features = [], {}
+    for k, (s, scope) in enumerate(scopes.items()):
+        mine = [(test, cols) for sets, test, cols in compiled if s in sets]
+        features[s] = [cols for _, cols in mine]
+        cols = dict.fromkeys(c for _, cs in mine for c in cs)
+        when = ("ok" if scope != "present" else
+                " and ".join(f"{variables[c]} is not None" for c in cols) or "True")
+        src.append(f"    m{k} = 0")
+        src.append(f"    if {when}:")
+        src += [f"        if {test}: m{k} |= {1 << bit}" for bit, (test, _) in enumerate(mine)]
+        src.append("        pass")
+        if scope == "flag-missing":
+            src.append(f"    else: m{k} = -1")
+    columns = list(variables)
+    src = ([f"def rules(ok, {', '.join(variables[c] for c in columns)}):"] + src +
+           [f"    return ({''.join(f'm{k}, ' for k in range(len(scopes)))})"])
+    scope = {}
+    exec("\n".join(src), scope)
+    return scope["rules"], columns, list(scopes), features
+
+def number(v):
+    if v == MISSING:
+        return None
+    try:
+        return float(v)
+    except ValueError:
+        return v
+
+def run_rules(t, path=RULES):
+    """Every rule set over t in one pass of the compiled function.
+    Returns {set: (features of broken rules, line numbers of broken rows)}."""
+    fn, columns, sets, features = compile_rules(path, t.header)
+    cols = [t.nums[c] if c in t.nums else [number(v) for v in t.raw[c]] for c in columns]
+    found = {s: (set(), []) for s in sets}
+    seen = {}    # (set, mask) -> features, masks repeat a lot
+    for line, masks in enumerate(map(fn, t.complete, *cols), 2):
+        for s, m in zip(sets, masks):
+            if m:
+                found[s][1].append(line)
+                if m > 0:
+                    if (s, m) not in seen:
+                        seen[s, m] = {c for bit, cs in enumerate(features[s])
+                                      if m >> bit & 1 for c in cs}
+                    found[s][0].update(seen[s, m])
+    return found
 
-    for r in rows:
-        if MISSING in r.values():
-            continue
+# ----------------------------------------------------------------------
+# D – Features with conflicting values
+# ----------------------------------------------------------------------
 
-        h   = float(r['HEIGHT'])
-        l   = float(r['LENGHT'])
-        a   = float(r['AREA'])
-        e   = float(r['ECCEN'])
-        pb  = float(r['P_BLACK'])
-        pa  = float(r['P_AND'])
-        bpx = float(r['BLACKPIX'])
-        ba  = float(r['BLACKAND'])
-
-        # Check violations
-        if abs(a - h * l) > 0.001:
-            bad_features.update(['HEIGHT','LENGHT','AREA'])
-        if h > 0 and abs(e - l/h) > 0.01:
-            bad_features.update(['ECCEN','HEIGHT','LENGHT'])
-        if a > 0 and abs(pb - bpx/a) > 0.001:
-            bad_features.update(['P_BLACK','BLACKPIX','AREA'])
-        if a > 0 and abs(pa - ba/a) > 0.001:
-            bad_features.update(['P_AND','BLACKAND','AREA'])
-
-    print_feature_results(bad_features)
+def find_D(t):
+    return t.rules()["D"][0]
 
 # ----------------------------------------------------------------------
 # E – Features with implausible values
 # ----------------------------------------------------------------------
 
-def check_E(path):
-    rows = load_rows(path)
-    bad_features = set()
-
-    for r in rows:
-        # Skip rows with missing values
-        if any(v == MISSING for v in r.values()):
-            continue
-
-        # Extract numeric values
-        height   = float(r["HEIGHT"])
-        length   = float(r["LENGHT"])
-        width    = float(r["WIDTH"])
-        area     = float(r["AREA"])
-        blackpix = float(r["BLACKPIX"])
-        blackand = float(r["BLACKAND"])
-        wb_trans = float(r["WB_TRANS"])
-        mean_tr  = float(r["MEAN_TR"])
-        eccen    = float(r["ECCEN"])
-        p_black  = float(r["P_BLACK"])
-        p_and    = float(r["P_AND"])
-        cls      = int(r["class!"])
-
-        # Check numeric plausibility
-        for col, val in [('HEIGHT',height),('LENGHT',length),('WIDTH',width),
-                         ('AREA',area),('BLACKPIX',blackpix),('BLACKAND',blackand),
-                         ('WB_TRANS',wb_trans),('MEAN_TR',mean_tr),('ECCEN',eccen)]:
-            if val <= 0:
-                bad_features.add(col)
-
-        # Check class plausibility
-        if not (1 <= cls <= 5):
-            bad_features.add('class!')
-
-        # Check logical plausibility
-        if blackpix > blackand:
-            bad_features.update(['BLACKPIX','BLACKAND'])
-        if not (0 <= p_black <= 1):
-            bad_features.add('P_BLACK')
-        if not (0 <= p_and <= 1):
-            bad_features.add('P_AND')
-
-    print_feature_results(bad_features)
+def find_E(t):
+    return t.rules()["E"][0]
 
 # ----------------------------------------------------------------------
 # G – Outlier cases
 # ----------------------------------------------------------------------
 
-def check_G(path):
-    rows = load_rows(path)
-    stds = {}
-    means = {}
-
-    for col in rows[0]:
-        vals = []
-        for row in rows:
-            if row[col] != '?' and col != "class!":
-                vals.append(float(row[col]))
-        stds[col] = sd(vals)
-        means[col] = mean(vals)
-
+def find_G(t):
+    stats = t.stats()
     bad_rows = set()
 
-    for i, row in enumerate(rows):
-        for col in means:
-            val = row[col]
-            if val == MISSING or col == "class!":
+    for i in range(t.n):
+        for col, (mu, sigma) in stats.items():
+            val = t.nums[col][i]
+            if val is None or sigma == 0:
                 continue
-            if stds[col] == 0:
-                continue
-
-            if abs(float(val) - means[col]) > 3 * stds[col]:
+            if abs(val - mu) > 3 * sigma:
                 bad_rows.add(i+2)
                 break
 
-    print_case_results(bad_rows)
+    return bad_rows
 
 # ----------------------------------------------------------------------
 # H – Inconsistent cases
 # ----------------------------------------------------------------------
 
-def check_H(path):
-    rows = load_rows(path)
-    
-    row_features = {}
-
-    for row in rows:
-        key = (
-            row["HEIGHT"], row["LENGHT"], row["WIDTH"], row["AREA"], row["ECCEN"],
-            row["P_BLACK"], row["P_AND"], row["MEAN_TR"], row["BLACKPIX"],
-            row["BLACKAND"], row["WB_TRANS"], row["DATASET_ID"]
-        )
-        try:
-            row_features[key].append(row["class!"])
-        except:
-            row_features[key] = [row["class!"]]
-
-    bad_rows = set()
-    for i, row in enumerate(rows):
-        key = (
-            row["HEIGHT"], row["LENGHT"], row["WIDTH"], row["AREA"], row["ECCEN"],
-            row["P_BLACK"], row["P_AND"], row["MEAN_TR"], row["BLACKPIX"],
-            row["BLACKAND"], row["WB_TRANS"], row["DATASET_ID"]
-        )
+def find_H(t, key=H_KEY):
+    return duplicates(key_records(t, key))[0]
+
+def find_dups(t, key=H_KEY):
+    "(conflicts, repeats) among t's rows, comparing only the key columns."
+    groups = duplicates(key_records(t, key))[1]
+    return conflicts(groups), repeats(groups)
+
+def key_records(t, key):
+    "(line, key fields, class) for every row of t."
+    missing = [c for c in key if c not in t.raw]
+    if missing:
+        sys.exit(f"Unknown key column(s): {', '.join(missing)}")
+    return zip(range(2, t.n + 2), zip(*[t.raw[c] for c in key]), t.raw[CLASS])
+
+def digest(fields):
+    "16-byte digest of a feature vector (fields stripped, then joined)."
+    s = "\x1f".join(v.strip() for v in fields)
+    return hashlib.blake2b(s.encode(), digest_size=16).digest()
+
+def duplicates(records):
+    """One pass over (line, key fields, class). Each feature vector becomes
+    a digest(), mapped to [first line, count, classes seen]. A line is
+    flagged once its digest turns up a second time (and the group's first
+    line with it). Returns (flagged lines, {digest: [first, n, classes]}):
+    see conflicts() and repeats() for the two kinds of group."""
+    groups, flagged = {}, set()
+    for line, fields, cls in records:
+        d = digest(fields)
+        g = groups.get(d)
+        if g is None:
+            groups[d] = [line, 1, {cls}]
+            continue
+        if g[1] == 1:
+            flagged.add(g[0])
+        g[1] += 1
+        g[2].add(cls)
+        flagged.add(line)
+    return flagged, groups
 
-        if len(row_features[key]) > 1:
-            bad_rows.add(i+2)
+def conflicts(groups):
+    "Groups whose identical feature vectors carry different classes."
+    return {d: g for d, g in groups.items() if len(g[2]) > 1}
 
-    print_case_results(bad_rows)
+def repeats(groups):
+    "Exact duplicates: groups seen 2+ times, always with the same class."
+    return {d: g for d, g in groups.items() if g[1] > 1 and len(g[2]) == 1}
 
 # ----------------------------------------------------------------------
 # I – Class-conditional outlier cases
 # ----------------------------------------------------------------------
 
-def check_I(path):
-    rows = load_rows(path)
-    
-    classes = set(row["class!"] for row in rows)
-
-    stds = {}
-    means = {}
-
-    for col in rows[0]:
-        if col == "class!":
-            continue
-    
-        means[col] = {}
-        stds[col] = {}
-
-        for cls in classes:
-            vals = []
-            for row in rows:
-                if row["class!"] == cls and row[col] != MISSING:
-                    vals.append(float(row[col]))
-
-            if len(vals) > 0:
-                means[col][cls] = mean(vals)
-                stds[col][cls] = sd(vals)
-            else:
-                means[col][cls] = 0
-                stds[col][cls] = 0
-
+def find_I(t):
+    stats = t.class_stats()
+    classes = t.raw[CLASS]
     bad_rows = set()
 
-    for i, row in enumerate(rows):
-        cls = row["class!"]
-
-        for col in means:
-            val = row[col]
-
-            if val == MISSING:
+    for i in range(t.n):
+        cls = classes[i]
+        for col in stats:
+            val = t.nums[col][i]
+            if val is None:
                 continue
-
-            if stds[col][cls] == 0:
+            mu, sigma = stats[col][cls]
+            if sigma == 0:
                 continue
-
-            if abs(float(val) - means[col][cls]) > 3 * stds[col][cls]:
+            if abs(val - mu) > 3 * sigma:
                 bad_rows.add(i + 2)  # +2 for header + 1-based indexing
                 break
 
-    print_case_results(bad_rows)
+    return bad_rows
 
 # ----------------------------------------------------------------------
 # J – Cases with conflicting feature values
 # ----------------------------------------------------------------------
 
-def check_J(path):
-    rows = load_rows(path)
-
-    bad_rows = []
-    for i, r in enumerate(rows):
-        needed = ['HEIGHT','LENGHT','AREA','ECCEN',
-                  'P_BLACK','P_AND','BLACKPIX','BLACKAND']
-        if any(r[c] == MISSING for c in needed):
-            continue
-
-        h   = float(r['HEIGHT']);  l  = float(r['LENGHT'])
-        a   = float(r['AREA']);    e  = float(r['ECCEN'])
-        pb  = float(r['P_BLACK']); pa = float(r['P_AND'])
-        bpx = float(r['BLACKPIX']); ba = float(r['BLACKAND'])
-
-        if (a != h * l
-            or (h > 0 and abs(e - l/h) > 0.01)
-            or (a > 0 and abs(pb - bpx/a) > 0.001)
-            or (a > 0 and abs(pa - ba/a)  > 0.001)):
-            bad_rows.append(i + 2)
-
-    print(len(bad_rows))
-    for r in bad_rows:
-        print(r)
+def find_J(t):
+    return t.rules()["J"][1]
 
 # ----------------------------------------------------------------------
 # K – Cases with implausible values
 # ----------------------------------------------------------------------
 
-def check_K(path):
-    rows = load_rows(path)
-
-    bad_rows = set()
-
-    for i, row in enumerate(rows):
+def find_K(t):
+    return t.rules()["K"][1]
 
-        if MISSING in row.values():
-            bad_rows.add(i + 2)
-            continue
-
-        height   = float(row["HEIGHT"])
-        length   = float(row["LENGHT"])
-        width    = float(row["WIDTH"])
-        area     = float(row["AREA"])
-        blackpix = float(row["BLACKPIX"])
-        blackand = float(row["BLACKAND"])
-        wb_trans = float(row["WB_TRANS"])
-        mean_tr  = float(row["MEAN_TR"])
-        eccen    = float(row["ECCEN"])
-        p_black  = float(row["P_BLACK"])
-        p_and    = float(row["P_AND"])
-        cls      = int(row["class!"])
-    
-        if any(v <= 0 for v in [
-            height, length, width, area,
-            blackpix, blackand, wb_trans,
-            mean_tr, eccen
-        ]):
-            bad_rows.add(i + 2)
-            continue
+# ----------------------------------------------------------------------
+# C, G, H, I – Streaming, in memory O(columns x classes) (H: O(keys))
+# ----------------------------------------------------------------------
 
-        if not (1 <= cls <= 5):
-            bad_rows.add(i + 2)
-            continue
+class Welford:
+    "Running count, mean and sum of squared deviations."
+    __slots__ = ("n", "mu", "m2")
+
+    def __init__(self):
+        self.n, self.mu, self.m2 = 0, 0.0, 0.0
+
+    def add(self, x):
+        self.n += 1
+        d = x - self.mu
+        self.mu += d / self.n
+        self.m2 += d * (x - self.mu)
+
+    def sd(self):
+        return sqrt(self.m2 / self.n) if self.n else 0
+
+def stream_rows(path):
+    "Yield (line number, row) for each non-empty data row; the header first."
+    with open(path, newline="") as f:
+        reader = csv.reader(f)
+        yield 1, next(reader)
+        i = 0
+        for r in reader:
+            if r:
+                yield i + 2, r
+                i += 1
+
+def stream_stats(path):
+    """Pass 1: Welford per numeric column and per (column, class).
+    Returns (header, {col: Welford}, {col: {class: Welford}})."""
+    rows = stream_rows(path)
+    _, header = next(rows)
+    k = header.index(CLASS)
+    cols = [(j, h) for j, h in enumerate(header) if h != CLASS]
+    total = {h: Welford() for _, h in cols}
+    by_class = {h: {} for _, h in cols}
+    for _, r in rows:
+        cls = r[k]
+        for j, h in cols:
+            if r[j] != MISSING:
+                x = float(r[j])
+                total[h].add(x)
+                w = by_class[h].get(cls)
+                if w is None:
+                    w = by_class[h][cls] = Welford()
+                w.add(x)
+    return header, total, by_class
+
+def stream_H(path, key=H_KEY):
+    "H in one streaming pass; memory is one small entry per distinct key."
+    rows = stream_rows(path)
+    _, header = next(rows)
+    at = [header.index(c) for c in key]
+    k = header.index(CLASS)
+    return duplicates((line, [r[j] for j in at], r[k]) for line, r in rows)[0]
+
+def stream_checks(path):
+    """C, G and I without holding the data: pass 1 gathers the statistics,
+    pass 2 reads the rows again and flags outliers (> 3 sd) by line number.
+    Returns (C features, G lines, I lines)."""
+    header, total, by_class = stream_stats(path)
+    k = header.index(CLASS)
+    cols = [(j, h, total[h].mu, total[h].sd(),
+             {cls: (w.mu, w.sd()) for cls, w in by_class[h].items()})
+            for j, h in enumerate(header) if h != CLASS]
+    C, G, I = set(), set(), set()
+    rows = stream_rows(path)
+    next(rows)
+    for line, r in rows:
+        cls = r[k]
+        for j, h, mu, sigma, per_class in cols:
+            if r[j] == MISSING:
+                continue
+            x = float(r[j])
+            if sigma and abs(x - mu) > 3 * sigma:
+                C.add(h)
+                G.add(line)
+            mu_k, sigma_k = per_class.get(cls, (0, 0))
+            if sigma_k and abs(x - mu_k) > 3 * sigma_k:
+                I.add(line)
+    return C, G, I
 
-        if blackpix > blackand:
-            bad_rows.add(i + 2)
-            continue
+# ----------------------------------------------------------------------
+# Drivers: one check per process, or all of them on one parse
+# ----------------------------------------------------------------------
 
-        if not (0 <= p_black <= 1) or not (0 <= p_and <= 1):
-            bad_rows.add(i + 2)
-            continue
-    
-    print_case_results(bad_rows)
+FEATURES = {"A": find_A, "B": find_B, "C": find_C, "D": find_D, "E": find_E}
+CASES    = {"G": find_G, "H": find_H, "I": find_I, "J": find_J, "K": find_K}
+
+def run_check(target, t, out=sys.stdout):
+    if target in FEATURES:
+        print_feature_results(FEATURES[target](t), out)
+    else:
+        print_case_results(CASES[target](t), out)
+
+def check(target, path):
+    run_check(target, load_table(path))
+
+def check_all(path, outdir="out"):
+    "Parse path once, then write every check's output to outdir/<target>."
+    t = load_table(path)
+    os.makedirs(outdir, exist_ok=True)
+    for target in [*FEATURES, *CASES]:
+        with open(os.path.join(outdir, target), "w") as out:
+            run_check(target, t, out)
+
+def check_stream(path, outdir="out"):
+    "Write outdir/C, G, H and I from streaming passes over path."
+    C, G, I = stream_checks(path)
+    os.makedirs(outdir, exist_ok=True)
+    for target, found, show in [("C", C, print_feature_results),
+                                ("G", G, print_case_results),
+                                ("H", stream_H(path), print_case_results),
+                                ("I", I, print_case_results)]:
+        with open(os.path.join(outdir, target), "w") as out:
+            show(found, out)
+
+def check_rules(path, rules=RULES):
+    "Every rule set in rules over path: broken features, then broken rows."
+    for s, (features, lines) in load_table(path, rules).rules().items():
+        print(f"# {s} features")
+        print_feature_results(features)
+        print(f"# {s} rows")
+        print_case_results(lines)
+
+def check_dups(path, key=",".join(H_KEY)):
+    """Duplicate groups by the comma-separated key columns: first line,
+    count and classes; conflicting labels first, then exact repeats."""
+    found = find_dups(load_table(path), [c.strip() for c in key.split(",")])
+    for title, groups in zip(["conflicts", "repeats"], found):
+        print(f"# {title}: {len(groups)}")
+        for first, n, classes in sorted(groups.values(), key=lambda g: g[0]):
+            print(first, n, ",".join(sorted(classes)))
+
+def check_A(path): check("A", path)
+def check_B(path): check("B", path)
+def check_C(path): check("C", path)
+def check_D(path): check("D", path)
+def check_E(path): check("E", path)
+def check_G(path): check("G", path)
+def check_H(path): check("H", path)
+def check_I(path): check("I", path)
+def check_J(path): check("J", path)
+def check_K(path): check("K", path)
 
 if __name__ == "__main__":
+    modes = {"all": check_all, "stream": check_stream, "rules": check_rules,
+             "dups": check_dups}
+    if len(sys.argv) == 4 and sys.argv[1] in modes:
+        modes[sys.argv[1]](sys.argv[2], sys.argv[3])
+        sys.exit()
     if len(sys.argv) != 3:
-        sys.exit("Usage: python3 checks.py <A–M> <data.csv>")
+        sys.exit("Usage: python3 checks.py <A–K> <data.csv>\n"
+                 "       python3 checks.py all <data.csv> [outdir]\n"
+                 "       python3 checks.py stream <data.csv> [outdir]   (C, G, H, I only)\n"
+                 "       python3 checks.py rules <data.csv> [rules file]\n"
+                 "       python3 checks.py dups <data.csv> [key,columns]")
 
     target = sys.argv[1]
     path   = sys.argv[2]
 
-    dispatch = {
-        "A": check_A,
-        "B": check_B,
-        "C": check_C,
-        "D": check_D,
-        "E": check_E,
-        "G": check_G,
-        "H": check_H,
-        "I": check_I,
-        "J": check_J,
-        "K": check_K,
-    }
-
-    if target not in dispatch:
+    if target in modes:
+        modes[target](path)
+    elif target in FEATURES or target in CASES:
+        check(target, path)
+    else:
         sys.exit(f"Unknown target: {target}")
-
-    dispatch[target](path)